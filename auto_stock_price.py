@@ -1,12 +1,20 @@
 import pandas as pd
 import psycopg2
+from psycopg2.extras import execute_values
+from openpyxl import load_workbook
 from datetime import datetime
 import logging
 from pathlib import Path
 import os
+import io
+import csv
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from psycopg2.pool import ThreadedConnectionPool
+from industry_registry import INDUSTRIES, PARTITIONED_PRICE_TABLE, PRICE_STORAGE
 
 class ExcelSheetImporter:
-    def __init__(self):
+    def __init__(self, storage=PRICE_STORAGE):
         log_dir = Path.home() / "stock_logs"
         log_dir.mkdir(exist_ok=True)
         log_file = log_dir / "stock_import.log"
@@ -25,31 +33,126 @@ class ExcelSheetImporter:
             'port': '5433'
         }
         
-        self.sheet_table_mapping = {
-            '金融': 'finance_prices',
-            '營建': 'construction_prices',
-            '航運': 'shipping_prices',
-            '半導體': 'semiconductor_prices',
-            '電子零組件': 'electronic_component_prices',
-            'ETF': 'etf_prices'
-        }
+        # storage 為 'partitioned' 時各頁籤寫入 stock_prices 中對應產業的分割區
+        self.storage = storage
+        self.sheet_table_mapping = {industry.name: industry.price_table_for(storage) for industry in INDUSTRIES}
 
-    def create_tables(self, conn):
-        cur = conn.cursor()
-        
+    def create_price_tables(self, cur, rebuild=True):
         for table_name in self.sheet_table_mapping.values():
+            if rebuild:
+                # 合併物化視圖依賴股價表時無法刪除，改為清空資料
+                cur.execute("SAVEPOINT drop_price_table;")
+                try:
+                    cur.execute(f"DROP TABLE IF EXISTS {table_name};")
+                except psycopg2.errors.DependentObjectsStillExist:
+                    cur.execute("ROLLBACK TO SAVEPOINT drop_price_table;")
+                    cur.execute(f"TRUNCATE {table_name} RESTART IDENTITY;")
+                    logging.info(f"{table_name} 仍被物化視圖使用，改為清空資料表")
+                # 重建後原本的高水位已不成立，留著會讓之後的增量匯入略過所有資料
+                cur.execute("DELETE FROM price_import_watermarks WHERE table_name = %s;", (table_name,))
+            
             cur.execute(f"""
-                DROP TABLE IF EXISTS {table_name};
-                CREATE TABLE {table_name} (
+                CREATE TABLE IF NOT EXISTS {table_name} (
                     id SERIAL PRIMARY KEY,
                     stock_code VARCHAR(20),
                     date DATE,
                     close_price FLOAT,
                     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 );
-                CREATE INDEX idx_{table_name}_stock_code 
+                CREATE INDEX IF NOT EXISTS idx_{table_name}_stock_code 
                 ON {table_name}(stock_code);
+                CREATE INDEX IF NOT EXISTS idx_{table_name}_stock_code_date
+                ON {table_name}(stock_code, date DESC);
             """)
+            
+            if not rebuild:
+                # 歷史模式以 (stock_code, date) 作為唯一鍵進行 upsert
+                cur.execute(f"""
+                    CREATE UNIQUE INDEX IF NOT EXISTS uq_{table_name}_stock_code_date
+                    ON {table_name}(stock_code, date);
+                """)
+
+    def create_partitioned_tables(self, cur, rebuild=True):
+        # 單一 stock_prices 表依產業 LIST 分割，各產業分割區再依日期 RANGE 分割，
+        # 年度分割區於寫入時依資料年份建立，其餘日期落入各產業的預設分割區
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {PARTITIONED_PRICE_TABLE} (
+                id BIGSERIAL,
+                industry_type VARCHAR(20) NOT NULL,
+                stock_code VARCHAR(20) NOT NULL,
+                date DATE NOT NULL,
+                close_price FLOAT,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (industry_type, stock_code, date)
+            ) PARTITION BY LIST (industry_type);
+            CREATE INDEX IF NOT EXISTS idx_{PARTITIONED_PRICE_TABLE}_stock_code_date
+            ON {PARTITIONED_PRICE_TABLE}(stock_code, date DESC);
+        """)
+        
+        for industry in INDUSTRIES:
+            partition = industry.price_partition
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS {partition}
+                PARTITION OF {PARTITIONED_PRICE_TABLE} FOR VALUES IN (%s)
+                PARTITION BY RANGE (date);
+                CREATE TABLE IF NOT EXISTS {partition}_default
+                PARTITION OF {partition} DEFAULT;
+            """, (industry.name,))
+            # 直接寫入產業分割區時自動帶入產業別，並提供 (stock_code, date) 的 upsert 唯一鍵
+            cur.execute(f"""
+                ALTER TABLE {partition} ALTER COLUMN industry_type SET DEFAULT %s;
+                CREATE UNIQUE INDEX IF NOT EXISTS uq_{partition}_stock_code_date
+                ON {partition}(stock_code, date);
+            """, (industry.name,))
+            
+            if rebuild:
+                cur.execute(f"TRUNCATE {partition};")
+                cur.execute("DELETE FROM price_import_watermarks WHERE table_name = %s;", (partition,))
+
+    def create_date_partitions(self, conn, table_name, years):
+        # 依資料年份建立年度分割區；預設分割區已有該年度資料時，先搬出再建立分割區後寫回
+        cur = conn.cursor()
+        for year in sorted(years):
+            partition = f"{table_name}_{year}"
+            cur.execute("SELECT to_regclass(%s);", (partition,))
+            if cur.fetchone()[0]:
+                continue
+            
+            start_date, end_date = f"{year}-01-01", f"{year + 1}-01-01"
+            cur.execute(f"""
+                CREATE TEMP TABLE {partition}_moved (LIKE {table_name}) ON COMMIT DROP;
+                WITH moved AS (
+                    DELETE FROM {table_name}_default
+                    WHERE date >= %s AND date < %s
+                    RETURNING *
+                )
+                INSERT INTO {partition}_moved SELECT * FROM moved;
+                CREATE TABLE {partition} PARTITION OF {table_name}
+                FOR VALUES FROM (%s) TO (%s);
+                INSERT INTO {table_name} SELECT * FROM {partition}_moved;
+                DROP TABLE {partition}_moved;
+            """, (start_date, end_date, start_date, end_date))
+            logging.info(f"建立分割區 {partition}")
+
+    def create_tables(self, conn, rebuild=True):
+        cur = conn.cursor()
+        
+        # 增量匯入的高水位：記錄每張表、每支股票已匯入的最新日期；
+        # 重建股價表時在同一個交易中清除該表的高水位，因此先建立
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS price_import_watermarks (
+                table_name VARCHAR(50),
+                stock_code VARCHAR(20),
+                last_date DATE NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (table_name, stock_code)
+            );
+        """)
+        
+        if self.storage == 'partitioned':
+            self.create_partitioned_tables(cur, rebuild)
+        else:
+            self.create_price_tables(cur, rebuild)
         
         conn.commit()
         logging.info("所有資料表建立完成")
@@ -64,6 +167,33 @@ class ExcelSheetImporter:
             logging.error(f"價格轉換錯誤: {value}, 錯誤: {str(e)}")
             raise
 
+    def read_workbook(self, excel_path, sheet_names=None):
+        # 以唯讀串流模式開啟活頁簿一次，依序讀出所有頁籤的代碼列與價格區塊
+        logging.info(f"開始讀取活頁簿 {excel_path}")
+        workbook = load_workbook(excel_path, read_only=True, data_only=True)
+        sheets = {}
+        
+        try:
+            for sheet_name in sheet_names or self.sheet_table_mapping:
+                if sheet_name not in workbook.sheetnames:
+                    logging.warning(f"活頁簿中找不到頁籤 {sheet_name}")
+                    continue
+                
+                rows = list(workbook[sheet_name].iter_rows(values_only=True))
+                if len(rows) < 3:
+                    logging.warning(f"頁籤 {sheet_name} 沒有價格數據")
+                    continue
+                
+                # 第一列為股票代碼，價格數據從第三列開始，並去除空白列
+                df_codes = pd.DataFrame([rows[0]])
+                df = pd.DataFrame(rows[2:]).dropna(how='all').reset_index(drop=True)
+                sheets[sheet_name] = (df_codes, df)
+        finally:
+            workbook.close()
+        
+        logging.info(f"活頁簿讀取完成，共 {len(sheets)} 個頁籤")
+        return sheets
+
     def read_sheet_data(self, excel_path, sheet_name):
         try:
             logging.info(f"開始讀取頁籤 {sheet_name}")
@@ -73,6 +203,14 @@ class ExcelSheetImporter:
             # 讀取價格數據，跳過前兩行
             df = pd.read_excel(excel_path, sheet_name=sheet_name, header=None, skiprows=2)
             
+            return self.parse_sheet_data(sheet_name, df_codes, df)
+            
+        except Exception as e:
+            logging.error(f"讀取頁籤 {sheet_name} 時發生錯誤: {str(e)}")
+            return []
+
+    def parse_sheet_data(self, sheet_name, df_codes, df):
+        try:
             # 處理日期欄
             base_date = pd.Timestamp('1899-12-30')
             latest_date_idx = len(df) - 1
@@ -116,43 +254,231 @@ class ExcelSheetImporter:
             return stock_data
             
         except Exception as e:
-            logging.error(f"讀取頁籤 {sheet_name} 時發生錯誤: {str(e)}")
+            logging.error(f"解析頁籤 {sheet_name} 時發生錯誤: {str(e)}")
             return []
 
-    def import_all_sheets(self, excel_path):
+    def parse_sheet_history(self, sheet_name, df_codes, df):
+        try:
+            codes = df_codes.iloc[0]
+            
+            # 找出所有 XTAI: 代碼欄，其右側一欄為對應價格
+            price_columns = {}
+            for col in range(0, df.shape[1] - 1, 2):
+                stock_code = codes.get(col)
+                if isinstance(stock_code, str) and stock_code.startswith('XTAI:'):
+                    price_columns[col + 1] = stock_code
+            
+            if not price_columns:
+                logging.warning(f"頁籤 {sheet_name} 找不到任何股票代碼")
+                return []
+            
+            # 以 Excel 序列日期批次轉換整欄日期
+            wide = df[list(price_columns)].rename(columns=price_columns)
+            wide.insert(0, 'date', pd.to_datetime(
+                pd.to_numeric(df[0], errors='coerce'), unit='D', origin='1899-12-30'
+            ))
+            wide = wide.dropna(subset=['date'])
+            
+            # 將代碼/價格欄位對展開成 (stock_code, date, price) 長表
+            long_df = wide.melt(id_vars='date', var_name='stock_code', value_name='raw_price')
+            long_df = long_df[long_df['raw_price'].notna()]
+            
+            cleaned = long_df['raw_price'].astype(str).str.replace('$', '', regex=False).str.strip()
+            long_df['close_price'] = pd.to_numeric(cleaned, errors='coerce').astype(float).round(2)
+            
+            for row in long_df[long_df['close_price'].isna()].itertuples(index=False):
+                logging.error(f"價格轉換錯誤: 股票 {row.stock_code} 日期 {row.date.date()} 價格 {row.raw_price}")
+            for row in long_df[long_df['close_price'] <= 0].itertuples(index=False):
+                logging.warning(f"股票 {row.stock_code} 日期 {row.date.date()} 價格異常: {row.close_price}")
+            
+            long_df = long_df[long_df['close_price'] > 0]
+            long_df['date'] = long_df['date'].dt.date
+            
+            stock_data = long_df[['stock_code', 'date', 'close_price']].to_dict('records')
+            logging.info(f"頁籤 {sheet_name} 共讀取到 {len(stock_data)} 筆歷史價格")
+            return stock_data
+            
+        except Exception as e:
+            logging.error(f"解析頁籤 {sheet_name} 歷史數據時發生錯誤: {str(e)}")
+            return []
+
+    def insert_rows(self, conn, table_name, stock_data):
+        cur = conn.cursor()
+        imported_count = 0
+        
+        for data in stock_data:
+            cur.execute(f"""
+                INSERT INTO {table_name} (stock_code, date, close_price)
+                VALUES (%s, %s, %s)
+            """, (
+                data['stock_code'],
+                data['date'],
+                data['close_price']
+            ))
+            imported_count += 1
+        
+        return imported_count
+
+    def copy_rows(self, conn, table_name, stock_data):
+        # 將整個頁籤的資料組成 CSV，以單次 COPY FROM STDIN 寫入
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for data in stock_data:
+            writer.writerow((data['stock_code'], data['date'].isoformat(), data['close_price']))
+        buffer.seek(0)
+        
+        cur = conn.cursor()
+        cur.copy_expert(
+            f"COPY {table_name} (stock_code, date, close_price) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+        return len(stock_data)
+
+    def upsert_rows(self, conn, table_name, stock_data):
+        # 先 COPY 到暫存表，再以單一 INSERT ... ON CONFLICT 合併進正式表
+        staging_table = f"{table_name}_staging"
+        cur = conn.cursor()
+        cur.execute(f"""
+            CREATE TEMP TABLE {staging_table} (
+                seq BIGSERIAL,
+                stock_code VARCHAR(20),
+                date DATE,
+                close_price FLOAT
+            ) ON COMMIT DROP;
+        """)
+        self.copy_rows(conn, staging_table, stock_data)
+        
+        # 同一鍵重複出現時保留最後一筆
+        cur.execute(f"""
+            INSERT INTO {table_name} (stock_code, date, close_price)
+            SELECT DISTINCT ON (stock_code, date) stock_code, date, close_price
+            FROM {staging_table}
+            ORDER BY stock_code, date, seq DESC
+            ON CONFLICT (stock_code, date)
+            DO UPDATE SET
+                close_price = EXCLUDED.close_price,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE {table_name}.close_price IS DISTINCT FROM EXCLUDED.close_price;
+        """)
+        return cur.rowcount
+
+    def load_watermarks(self, conn, table_name):
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT stock_code, last_date
+            FROM price_import_watermarks
+            WHERE table_name = %s
+        """, (table_name,))
+        watermarks = dict(cur.fetchall())
+        
+        if not watermarks:
+            # 尚無高水位紀錄時，以資料表中既有的最新日期作為起點
+            cur.execute(f"""
+                SELECT stock_code, MAX(date)
+                FROM {table_name}
+                GROUP BY stock_code
+            """)
+            watermarks = dict(cur.fetchall())
+        
+        return watermarks
+
+    def filter_new_rows(self, conn, table_name, stock_data):
+        watermarks = self.load_watermarks(conn, table_name)
+        new_rows = [
+            data for data in stock_data
+            if data['stock_code'] not in watermarks or data['date'] > watermarks[data['stock_code']]
+        ]
+        logging.info(f"表 {table_name} 共 {len(stock_data)} 筆數據，其中 {len(new_rows)} 筆晚於高水位")
+        return new_rows
+
+    def update_watermarks(self, conn, table_name, stock_data):
+        latest_dates = {}
+        for data in stock_data:
+            if data['stock_code'] not in latest_dates or data['date'] > latest_dates[data['stock_code']]:
+                latest_dates[data['stock_code']] = data['date']
+        
+        cur = conn.cursor()
+        execute_values(cur, """
+            INSERT INTO price_import_watermarks (table_name, stock_code, last_date)
+            VALUES %s
+            ON CONFLICT (table_name, stock_code)
+            DO UPDATE SET
+                last_date = GREATEST(price_import_watermarks.last_date, EXCLUDED.last_date),
+                updated_at = CURRENT_TIMESTAMP
+        """, [(table_name, stock_code, last_date) for stock_code, last_date in latest_dates.items()])
+
+    def write_sheet_data(self, conn, table_name, stock_data, bulk=False, upsert=False, incremental=False):
+        start_time = time.perf_counter()
+        
+        if self.storage == 'partitioned':
+            self.create_date_partitions(conn, table_name, {data['date'].year for data in stock_data})
+        
+        if incremental or upsert:
+            # history 與 incremental 的價格與高水位在同一個交易中寫入，重跑時結果一致
+            imported_count = self.upsert_rows(conn, table_name, stock_data)
+            self.update_watermarks(conn, table_name, stock_data)
+        elif bulk:
+            try:
+                imported_count = self.copy_rows(conn, table_name, stock_data)
+            except Exception as e:
+                # COPY 為整批寫入，失敗時改回逐筆寫入
+                logging.error(f"COPY 寫入表 {table_name} 失敗，改為逐筆寫入: {str(e)}")
+                conn.rollback()
+                imported_count = self.insert_rows(conn, table_name, stock_data)
+        else:
+            imported_count = self.insert_rows(conn, table_name, stock_data)
+        
+        conn.commit()
+        
+        elapsed = time.perf_counter() - start_time
+        rows_per_sec = imported_count / elapsed if elapsed > 0 else float(imported_count)
+        logging.info(
+            f"成功匯入 {imported_count} 筆數據到表 {table_name}，"
+            f"耗時 {elapsed:.3f} 秒 ({rows_per_sec:.0f} 筆/秒)"
+        )
+        return imported_count
+
+    def import_all_sheets(self, excel_path, bulk=False, mode='snapshot'):
+        # mode: 'snapshot' 只匯入每個頁籤最新一天並重建資料表；
+        #       'history' 匯入完整歷史價格並以 (stock_code, date) upsert，保留既有資料；
+        #       'incremental' 同 history，但只寫入晚於各股票高水位日期的新數據
+        if mode not in ('snapshot', 'history', 'incremental'):
+            raise ValueError(f"不支援的匯入模式: {mode}")
+        
+        history = mode in ('history', 'incremental')
+        incremental = mode == 'incremental'
         conn = None
         try:
-            logging.info("開始匯入所有頁籤數據")
+            logging.info(f"開始匯入所有頁籤數據 (模式: {mode})")
             conn = psycopg2.connect(**self.db_params)
             
             # 建立所有必要的表
-            self.create_tables(conn)
+            self.create_tables(conn, rebuild=not history)
             
             total_imported = 0
             
+            # 整本活頁簿只解析一次
+            sheets = self.read_workbook(excel_path)
+            
             # 處理每個頁籤
             for sheet_name, table_name in self.sheet_table_mapping.items():
                 try:
-                    stock_data = self.read_sheet_data(excel_path, sheet_name)
+                    if sheet_name not in sheets:
+                        continue
+                    
+                    df_codes, df = sheets[sheet_name]
+                    if history:
+                        stock_data = self.parse_sheet_history(sheet_name, df_codes, df)
+                    else:
+                        stock_data = self.parse_sheet_data(sheet_name, df_codes, df)
+                    
+                    if stock_data and incremental:
+                        stock_data = self.filter_new_rows(conn, table_name, stock_data)
                     
                     if stock_data:
-                        cur = conn.cursor()
-                        imported_count = 0
-                        
-                        for data in stock_data:
-                            cur.execute(f"""
-                                INSERT INTO {table_name} (stock_code, date, close_price)
-                                VALUES (%s, %s, %s)
-                            """, (
-                                data['stock_code'],
-                                data['date'],
-                                data['close_price']
-                            ))
-                            imported_count += 1
-                        
-                        conn.commit()
-                        total_imported += imported_count
-                        logging.info(f"成功匯入 {imported_count} 筆數據到表 {table_name}")
+                        total_imported += self.write_sheet_data(
+                            conn, table_name, stock_data, bulk=bulk, upsert=history, incremental=incremental
+                        )
                         
                 except Exception as e:
                     logging.error(f"處理頁籤 {sheet_name} 時發生錯誤: {str(e)}")
@@ -172,6 +498,102 @@ class ExcelSheetImporter:
             if conn:
                 conn.close()
 
+    def write_sheet_pooled(self, pool, sheet_name, table_name, stock_data, bulk=False, history=False, incremental=False):
+        conn = pool.getconn()
+        try:
+            if incremental:
+                stock_data = self.filter_new_rows(conn, table_name, stock_data)
+            if not stock_data:
+                return 0
+            return self.write_sheet_data(
+                conn, table_name, stock_data, bulk=bulk, upsert=history, incremental=incremental
+            )
+            
+        except Exception as e:
+            logging.error(f"寫入頁籤 {sheet_name} 到表 {table_name} 時發生錯誤: {str(e)}")
+            conn.rollback()
+            return 0
+            
+        finally:
+            pool.putconn(conn)
+
+    def import_all_sheets_parallel(self, excel_path, max_workers=4, bulk=False, mode='snapshot'):
+        # 頁籤解析在行程池中進行，解析完成的頁籤立即交給執行緒池，
+        # 以連線池中各自的連線寫入對應的資料表
+        if mode not in ('snapshot', 'history', 'incremental'):
+            raise ValueError(f"不支援的匯入模式: {mode}")
+        
+        history = mode in ('history', 'incremental')
+        incremental = mode == 'incremental'
+        pool = None
+        try:
+            logging.info(f"開始平行匯入所有頁籤數據 (模式: {mode}, 工作數: {max_workers})")
+            start_time = time.perf_counter()
+            pool = ThreadedConnectionPool(1, max_workers, **self.db_params)
+            
+            conn = pool.getconn()
+            try:
+                self.create_tables(conn, rebuild=not history)
+            finally:
+                pool.putconn(conn)
+            
+            total_imported = 0
+            
+            with ProcessPoolExecutor(max_workers=max_workers) as parse_executor, \
+                    ThreadPoolExecutor(max_workers=max_workers) as write_executor:
+                parse_futures = {
+                    parse_executor.submit(parse_sheet_worker, excel_path, sheet_name, history): sheet_name
+                    for sheet_name in self.sheet_table_mapping
+                }
+                
+                write_futures = {}
+                for future in as_completed(parse_futures):
+                    sheet_name = parse_futures[future]
+                    try:
+                        stock_data, parse_elapsed = future.result()
+                    except Exception as e:
+                        logging.error(f"解析頁籤 {sheet_name} 時發生錯誤: {str(e)}")
+                        continue
+                    
+                    logging.info(f"頁籤 {sheet_name} 解析耗時 {parse_elapsed:.3f} 秒")
+                    if stock_data:
+                        table_name = self.sheet_table_mapping[sheet_name]
+                        write_futures[write_executor.submit(
+                            self.write_sheet_pooled, pool, sheet_name, table_name, stock_data,
+                            bulk=bulk, history=history, incremental=incremental
+                        )] = sheet_name
+                
+                for future in as_completed(write_futures):
+                    total_imported += future.result()
+            
+            elapsed = time.perf_counter() - start_time
+            logging.info(f"所有頁籤平行匯入完成，共匯入 {total_imported} 筆數據，總耗時 {elapsed:.3f} 秒")
+            return total_imported
+            
+        except Exception as e:
+            logging.error(f"平行匯入過程中發生錯誤: {str(e)}")
+            return 0
+            
+        finally:
+            if pool:
+                pool.closeall()
+
+def parse_sheet_worker(excel_path, sheet_name, history=False):
+    # 於子行程中只讀取並解析單一頁籤
+    start_time = time.perf_counter()
+    importer = ExcelSheetImporter()
+    sheets = importer.read_workbook(excel_path, sheet_names=[sheet_name])
+    
+    if sheet_name not in sheets:
+        return [], time.perf_counter() - start_time
+    
+    df_codes, df = sheets[sheet_name]
+    if history:
+        stock_data = importer.parse_sheet_history(sheet_name, df_codes, df)
+    else:
+        stock_data = importer.parse_sheet_data(sheet_name, df_codes, df)
+    return stock_data, time.perf_counter() - start_time
+
 def main():
     try:
         excel_path = "/Users/tommy/Desktop/資料庫/資料庫20大股池資料.xlsx"
@@ -180,7 +602,7 @@ def main():
             return
             
         importer = ExcelSheetImporter()
-        total_imported = importer.import_all_sheets(excel_path)
+        total_imported = importer.import_all_sheets(excel_path, bulk=True)
         print(f"成功匯入 {total_imported} 筆數據")
         
     except Exception as e:
@@ -0,0 +1,137 @@
+import os
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+# 資料庫連線參數，可用環境變數覆寫
+DB_PARAMS = {
+    'dbname': os.environ.get('STOCK_DB_NAME', 'stock_recommendation_system'),
+    'user': os.environ.get('STOCK_DB_USER', 'test'),
+    'password': os.environ.get('STOCK_DB_PASSWORD', '123456'),
+    'host': os.environ.get('STOCK_DB_HOST', 'localhost'),
+    'port': os.environ.get('STOCK_DB_PORT', '5433')
+}
+
+# 連線池設定
+POOL_MIN_SIZE = int(os.environ.get('STOCK_DB_POOL_MIN_SIZE', '1'))
+POOL_MAX_SIZE = int(os.environ.get('STOCK_DB_POOL_MAX_SIZE', '10'))
+POOL_ACQUIRE_TIMEOUT = float(os.environ.get('STOCK_DB_POOL_ACQUIRE_TIMEOUT', '5'))
+
+class PoolTimeoutError(Exception):
+    pass
+
+class ConnectionPool:
+    def __init__(self, db_params: Dict, min_size: int = POOL_MIN_SIZE, max_size: int = POOL_MAX_SIZE,
+                 acquire_timeout: float = POOL_ACQUIRE_TIMEOUT):
+        self.db_params = db_params
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        # psycopg2 的 ThreadedConnectionPool 在閒置連線達 minconn 條後會關閉歸還的連線，
+        # 預設 minconn=1 時每個請求幾乎都要重新連線；因此自行保存閒置連線，歸還的連線一律保留。
+        # 代價是尖峰過後最多 max_size 條連線會一直佔用資料庫的 backend，不會自動縮減
+        self._idle = [psycopg2.connect(**db_params) for _ in range(min_size)]
+        self._lock = threading.Lock()
+        # 號誌限制同時取出的連線數，閒置加上使用中的連線因此不超過 max_size；用盡時讓取用者排隊等待
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def _is_healthy(self, conn) -> bool:
+        # 資料庫重啟後，即使剛用過的連線也會失效，每次取出都以 SELECT 1 檢查
+        if conn.closed:
+            return False
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1;")
+            cursor.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self, timeout: Optional[float] = None):
+        timeout = self.acquire_timeout if timeout is None else timeout
+        if not self._slots.acquire(timeout=timeout):
+            raise PoolTimeoutError(f"等待資料庫連線逾時 ({timeout} 秒)")
+
+        try:
+            # 池中可能有多條失效的連線，逐一捨棄直到取得可用的連線；
+            # 池中閒置連線最多 max_size 條，超過次數仍失敗表示新建立的連線也無法使用
+            conn = self._take()
+            attempts = 0
+            while not self._is_healthy(conn):
+                logging.warning("資料庫連線已失效，重新建立連線")
+                self._discard(conn)
+                attempts += 1
+                if attempts > self.max_size:
+                    raise psycopg2.OperationalError("無法取得可用的資料庫連線")
+                conn = self._take()
+            return conn
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _take(self):
+        # 優先取用最近歸還的連線，沒有閒置連線時才建立新連線
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return psycopg2.connect(**self.db_params)
+
+    def _discard(self, conn) -> None:
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def putconn(self, conn) -> None:
+        try:
+            # 歸還前結束未提交的交易，連線異常時直接關閉
+            broken = bool(conn.closed)
+            if not broken and conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    broken = True
+
+            if broken:
+                self._discard(conn)
+            else:
+                with self._lock:
+                    self._idle.append(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def closeall(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    # 同一行程內的所有 Flask 應用共用一個連線池，第一次使用時才建立
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = ConnectionPool(DB_PARAMS)
+            logging.info(f"建立資料庫連線池 (上限 {POOL_MAX_SIZE} 條連線)")
+        return _shared_pool
+
+def getconn(timeout: Optional[float] = None):
+    return get_pool().getconn(timeout)
+
+def putconn(conn) -> None:
+    get_pool().putconn(conn)
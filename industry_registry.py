@@ -0,0 +1,81 @@
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+# 股價儲存方式：'tables' 每個產業一張股價表；
+# 'partitioned' 單一 stock_prices 表，依產業 LIST 分割、再依日期逐年 RANGE 分割
+PRICE_STORAGE = os.environ.get('STOCK_PRICE_STORAGE', 'tables')
+PRICE_STORAGES = ('tables', 'partitioned')
+PARTITIONED_PRICE_TABLE = "stock_prices"
+
+# 各產業共用的 Excel 欄位對應
+COMMON_COLUMNS = {
+    '股票代碼': 'stock_code',
+    '股票名稱': 'stock_name',
+    '近5年平均殖利率': 'avg_5_year_dividend_yield'
+}
+
+# 評價模型需要的 Excel 欄位對應，同時決定基本面資料表的數值欄位
+MODEL_COLUMNS = {
+    "pb": {
+        '每股淨值': 'net_value_per_share',
+        '股淨比': 'book_to_net_value_ratio'
+    },
+    "pe": {
+        '每股盈餘': 'earnings_per_share',
+        '本益比': 'price_to_earnings_ratio'
+    },
+    "nav": {
+        'ETF淨值': 'net_asset_value_per_etf'
+    }
+}
+
+@dataclass(frozen=True)
+class Industry:
+    key: str                            # IndustryType 成員名稱
+    name: str                           # 產業名稱，同時是 Excel 頁籤名稱與合併表的 industry_type
+    slug: str                           # 英文代號，用於資料表、分割區等名稱
+    value_table: str
+    price_table: str
+    valuation_model: str                # pb / pe / nav
+    multipliers: Tuple[float, float]    # 合理價格區間倍數 (下限, 上限)
+
+    @property
+    def column_map(self) -> Dict[str, str]:
+        return {**COMMON_COLUMNS, **MODEL_COLUMNS[self.valuation_model]}
+
+    @property
+    def value_columns(self) -> List[str]:
+        # 基本面資料表中 stock_code 與合理價格欄位以外的欄位
+        return [column for column in self.column_map.values() if column != 'stock_code']
+
+    @property
+    def metric_columns(self) -> List[str]:
+        return list(MODEL_COLUMNS[self.valuation_model].values())
+
+    @property
+    def price_partition(self) -> str:
+        # stock_prices 中此產業的分割區，本身再依日期分割
+        return f"{PARTITIONED_PRICE_TABLE}_{self.slug}"
+
+    def price_table_for(self, storage: str) -> str:
+        if storage not in PRICE_STORAGES:
+            raise ValueError(f"不支援的股價儲存方式: {storage}")
+        return self.price_partition if storage == 'partitioned' else self.price_table
+
+# 新增產業只需在此加入一筆設定，匯入、估值、合併與網頁篩選都會依此產生
+INDUSTRIES = [
+    Industry("FINANCIAL", "金融", "finance", "finance_value", "finance_prices", "pb", (0.8, 1.2)),
+    Industry("CONSTRUCTION", "營建", "construction", "construction_value", "construction_prices", "pb", (0.7, 1.1)),
+    Industry("SHIPPING", "航運", "shipping", "shipping_value", "shipping_prices", "pe", (0.6, 0.9)),
+    Industry("SEMICONDUCTOR", "半導體", "semiconductor", "semiconductor_value", "semiconductor_prices", "pe", (0.8, 1.2)),
+    Industry("ELECTRONIC", "電子零組件", "electronic", "electronic_components_value", "electronic_component_prices", "pe", (0.8, 1.2)),
+    Industry("ETF", "ETF", "etf", "etf_value", "etf_prices", "nav", (0.98, 1.02)),
+]
+
+INDUSTRIES_BY_NAME = {industry.name: industry for industry in INDUSTRIES}
+
+def get_industry(name: str) -> Industry:
+    if name not in INDUSTRIES_BY_NAME:
+        raise ValueError(f"未支援的產業類型: {name}")
+    return INDUSTRIES_BY_NAME[name]
@@ -1,10 +1,73 @@
 import psycopg2
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from psycopg2.pool import ThreadedConnectionPool
 from typing import Dict, List
-from datetime import datetime
+from datetime import datetime, timedelta
+from stock_data_version import bump_data_version
+from industry_registry import INDUSTRIES, PRICE_STORAGE
+
+# 依收盤價與合理價格上下限計算買賣評等，與 StockEvaluationSystem.evaluate_stock 規則相同
+RATING_CASE_SQL = """
+    CASE
+        WHEN p.close_price IS NULL OR v.fair_low IS NULL OR v.fair_high IS NULL THEN '不予評價'
+        WHEN p.close_price < v.fair_low THEN '加碼'
+        WHEN p.close_price < (v.fair_low + v.fair_high) / 2 THEN '便宜'
+        WHEN p.close_price <= v.fair_high THEN '合理'
+        ELSE '昂貴'
+    END
+"""
+
+# 合併表寫入的欄位，順序與 industry_select_sql 的 SELECT 相同
+MERGED_COLUMNS = [
+    "stock_code",
+    "stock_name",
+    "industry_type",
+    "date",
+    "avg_5_year_dividend_yield",
+    "close_price",
+    "fair_value_range",
+    "fair_low",
+    "fair_high",
+    "rating"
+]
+
+MERGED_TABLE = "stock_all_industry_merge"
+
+# 儀表板查詢需要的欄位，放入覆蓋索引的 INCLUDE 以支援 index-only scan
+DASHBOARD_COLUMNS = "stock_name, close_price, fair_value_range, fair_low, fair_high, avg_5_year_dividend_yield"
+
+# /api/stocks 可排序欄位對應的 SQL 排序鍵，評等依 加碼→便宜→合理→昂貴 排列；
+# 合併表以相同的運算式建立排序索引，運算式不一致時查詢無法使用索引排序
+SORT_COLUMNS = {
+    "stock_code": "stock_code",
+    "close_price": "close_price",
+    "avg_5_year_dividend_yield": "COALESCE(avg_5_year_dividend_yield, 0)",
+    "rating": "CASE rating WHEN '加碼' THEN 1 WHEN '便宜' THEN 2 WHEN '合理' THEN 3 WHEN '昂貴' THEN 4 ELSE 999 END",
+}
+
+# 合併表索引 (名稱, 欄位, 是否唯一, INCLUDE 欄位)；
+# 產業與評等的覆蓋索引依儀表板預設排序 (industry_type, stock_code, date) 建立，
+# 其餘排序鍵各有 (排序鍵, stock_code, date) 索引，stock_code 排序使用唯一索引
+MERGED_INDEXES = [
+    ("idx_all_merge_stock_code", "stock_code", False, None),
+    ("idx_all_merge_industry_covering", "industry_type, stock_code, date", False, f"{DASHBOARD_COLUMNS}, rating"),
+    ("idx_all_merge_date", "date", False, None),
+    ("idx_all_merge_fair_low", "fair_low", False, None),
+    ("idx_all_merge_fair_high", "fair_high", False, None),
+    ("idx_all_merge_rating_covering", "rating, industry_type, stock_code, date", False, DASHBOARD_COLUMNS),
+    ("uq_all_merge_stock_code_date", "stock_code, date", True, None),
+    ("idx_all_merge_close_price_sort", f"{SORT_COLUMNS['close_price']}, stock_code, date", False, None),
+    ("idx_all_merge_yield_sort", f"({SORT_COLUMNS['avg_5_year_dividend_yield']}), stock_code, date", False, None),
+    ("idx_all_merge_rating_sort", f"({SORT_COLUMNS['rating']}), stock_code, date", False, None),
+]
+
+# 增量合併時往前重疊的秒數，涵蓋上次合併期間尚未提交的來源交易
+MERGE_OVERLAP_SECONDS = 300
 
 class StockDataMerger:
-    def __init__(self):
+    def __init__(self, storage: str = PRICE_STORAGE):
         self.db_params = {
             'dbname': 'stock_recommendation_system',
             'user': 'test',
@@ -18,30 +81,24 @@ class StockDataMerger:
             format='%(asctime)s - %(levelname)s - %(message)s'
         )
         
-        self.industries = [
-            "金融",
-            "營建",
-            "航運",
-            "半導體",
-            "電子零組件",
-            "ETF"
-        ]
+        # storage 為 'partitioned' 時直接讀取 stock_prices 中各產業的分割區
+        self.storage = storage
+        self.industries = [industry.name for industry in INDUSTRIES]
         self.table_mapping = {
-            "金融": ("finance_value", "finance_prices"),
-            "營建": ("construction_value", "construction_prices"),
-            "航運": ("shipping_value", "shipping_prices"),
-            "半導體": ("semiconductor_value", "semiconductor_prices"),
-            "電子零組件": ("electronic_components_value", "electronic_component_prices"),
-            "ETF": ("etf_value", "etf_prices")
+            industry.name: (industry.value_table, industry.price_table_for(storage)) for industry in INDUSTRIES
         }
+        # 只保留每支股票最新一筆股價，由 merge_all_data 設定
+        self.latest_only = False
 
-    def create_merged_table(self, conn) -> None:
+    def create_merged_table(self, conn, rebuild: bool = True, table_name: str = MERGED_TABLE) -> None:
         try:
             cursor = conn.cursor()
 
-            cursor.execute("""
-                DROP TABLE IF EXISTS stock_all_industry_merge;
-                CREATE TABLE stock_all_industry_merge (
+            if rebuild:
+                self.drop_merged_relation(conn, table_name)
+
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table_name} (
                     id SERIAL PRIMARY KEY,
                     stock_code VARCHAR(20),
                     stock_name VARCHAR(50),
@@ -50,49 +107,122 @@ class StockDataMerger:
                     avg_5_year_dividend_yield FLOAT,
                     close_price FLOAT,
                     fair_value_range VARCHAR(30),
+                    fair_low FLOAT,
+                    fair_high FLOAT,
+                    rating VARCHAR(10),
                     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 );
             """)
             
+            if not rebuild:
+                # 既有的合併表可能是舊版建立的，補上合理價格上下限與評等欄位
+                cursor.execute(f"""
+                    ALTER TABLE {table_name}
+                    ADD COLUMN IF NOT EXISTS fair_low FLOAT,
+                    ADD COLUMN IF NOT EXISTS fair_high FLOAT,
+                    ADD COLUMN IF NOT EXISTS rating VARCHAR(10);
+                """)
+
+                # 增量合併以 (stock_code, date) 作為 upsert 的唯一鍵；
+                # 第一次建立唯一索引前，重複的 (stock_code, date) 只保留最後寫入 (id 最大) 的一筆
+                cursor.execute("SELECT to_regclass('uq_all_merge_stock_code_date');")
+                if cursor.fetchone()[0] is None:
+                    cursor.execute(f"""
+                        DELETE FROM {table_name} a
+                        USING {table_name} b
+                        WHERE a.stock_code = b.stock_code
+                          AND a.date = b.date
+                          AND a.id < b.id;
+                    """)
+                    if cursor.rowcount:
+                        logging.info(f"移除 {table_name} 中 {cursor.rowcount} 筆重複的 (stock_code, date) 資料")
+                    cursor.execute(f"""
+                        CREATE UNIQUE INDEX uq_all_merge_stock_code_date
+                        ON {table_name}(stock_code, date);
+                    """)
+            
+            self.create_merge_state_table(conn)
+            
             conn.commit()
-            logging.info("成功創建合併表 stock_all_industry_merge")
+            logging.info(f"成功創建合併表 {table_name}")
             
         except Exception as e:
             conn.rollback()
             logging.error(f"創建合併表時發生錯誤: {str(e)}")
             raise
 
-    def merge_industry_data(self, conn, industry: str) -> None:
-        try:
-            cursor = conn.cursor()
-            value_table, price_table = self.table_mapping[industry]
-            
-            insert_query = f"""
-                INSERT INTO stock_all_industry_merge (
-                    stock_code,
-                    stock_name,
-                    industry_type,
-                    date,
-                    avg_5_year_dividend_yield,
-                    close_price,
-                    fair_value_range
-                )
-                SELECT 
+    def create_merge_state_table(self, conn) -> None:
+        # 記錄各產業上次合併的時間
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS stock_merge_state (
+                industry_type VARCHAR(20) PRIMARY KEY,
+                last_merged_at TIMESTAMP NOT NULL
+            );
+        """)
+
+    def merged_relation_kind(self, conn, table_name: str = MERGED_TABLE):
+        # 回傳 'r' (資料表)、'm' (物化視圖)，不存在時回傳 None
+        cursor = conn.cursor()
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s);", (table_name,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def drop_merged_relation(self, conn, table_name: str = MERGED_TABLE) -> None:
+        # 合併表可能是資料表或物化視圖，依實際型態刪除
+        cursor = conn.cursor()
+        if self.merged_relation_kind(conn, table_name) == "m":
+            cursor.execute(f"DROP MATERIALIZED VIEW {table_name};")
+        else:
+            cursor.execute(f"DROP TABLE IF EXISTS {table_name};")
+
+    def industry_select_sql(self, industry: str, where: str = "") -> str:
+        # 單一產業基本面與股價的 JOIN，產業名稱以 %s 參數傳入；
+        # 同一股票同一日期重複匯入時只取最後寫入的股價，確保 (stock_code, date) 唯一。
+        # latest_only 時以 LATERAL 沿 (stock_code, date DESC) 索引只取每支股票最新一筆股價
+        value_table, price_table = self.table_mapping[industry]
+        if self.latest_only:
+            price_source = f"""CROSS JOIN LATERAL (
+                    SELECT *
+                    FROM {price_table}
+                    WHERE stock_code = v.stock_code
+                    ORDER BY date DESC, id DESC
+                    LIMIT 1
+                ) p"""
+        else:
+            price_source = f"JOIN {price_table} p ON v.stock_code = p.stock_code"
+        return f"""
+                SELECT DISTINCT ON (p.stock_code, p.date)
                     v.stock_code,
                     v.stock_name,
                     %s as industry_type,
                     p.date,
                     v.avg_5_year_dividend_yield,
                     p.close_price,
-                    v.fair_price_range
+                    v.fair_price_range AS fair_value_range,
+                    v.fair_low,
+                    v.fair_high,
+                    {RATING_CASE_SQL} AS rating
                 FROM {value_table} v
-                JOIN {price_table} p ON v.stock_code = p.stock_code;
+                {price_source}
+                {where}
+                ORDER BY p.stock_code, p.date, p.id DESC
+        """
+
+    def merge_industry_data(self, conn, industry: str, table_name: str = MERGED_TABLE, commit: bool = True) -> None:
+        try:
+            cursor = conn.cursor()
+            
+            insert_query = f"""
+                INSERT INTO {table_name} ({", ".join(MERGED_COLUMNS)})
+                {self.industry_select_sql(industry)};
             """
             
             cursor.execute(insert_query, (industry,))
-            conn.commit()
+            if commit:
+                conn.commit()
             
-            cursor.execute("SELECT COUNT(*) FROM stock_all_industry_merge WHERE industry_type = %s", (industry,))
+            cursor.execute(f"SELECT COUNT(*) FROM {table_name} WHERE industry_type = %s", (industry,))
             count = cursor.fetchone()[0]
             logging.info(f"成功合併 {industry} 產業資料，插入 {count} 筆記錄")
             
@@ -101,20 +231,96 @@ class StockDataMerger:
             logging.error(f"合併 {industry} 產業資料時發生錯誤: {str(e)}")
             raise
 
-    def create_indexes(self, conn) -> None:
+    def merge_industry_incremental(self, conn, industry: str, since) -> int:
+        # 只 upsert 上次合併後基本面或股價有更新的資料列，不提交交易
+        cursor = conn.cursor()
+        changed_columns = [column for column in MERGED_COLUMNS if column not in ("stock_code", "date")]
+        update_columns = ",\n                    ".join(f"{column} = EXCLUDED.{column}" for column in changed_columns)
+        if since is not None:
+            since = since - timedelta(seconds=MERGE_OVERLAP_SECONDS)
+        
+        upsert_query = f"""
+                INSERT INTO stock_all_industry_merge ({", ".join(MERGED_COLUMNS)})
+                {self.industry_select_sql(industry, "WHERE %s::timestamp IS NULL OR v.updated_at > %s OR p.updated_at > %s")}
+                ON CONFLICT (stock_code, date)
+                DO UPDATE SET
+                    {update_columns},
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE ({", ".join(f"stock_all_industry_merge.{column}" for column in changed_columns)})
+                    IS DISTINCT FROM ({", ".join(f"EXCLUDED.{column}" for column in changed_columns)});
+        """
+        
+        cursor.execute(upsert_query, (industry, since, since, since))
+        logging.info(f"增量合併 {industry} 產業資料，更新 {cursor.rowcount} 筆記錄")
+        return cursor.rowcount
+
+    def delete_orphan_rows(self, conn, industry: str) -> int:
+        # 刪除來源已不存在的合併資料列 (基本面表刪除的股票、快照重新匯入後消失的股價)，不提交交易
+        value_table, price_table = self.table_mapping[industry]
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            DELETE FROM stock_all_industry_merge m
+            WHERE m.industry_type = %s
+              AND NOT EXISTS (
+                  SELECT 1
+                  FROM {value_table} v
+                  JOIN {price_table} p ON p.stock_code = v.stock_code
+                  WHERE v.stock_code = m.stock_code
+                    AND p.date = m.date
+              );
+        """, (industry,))
+        logging.info(f"刪除 {industry} 產業 {cursor.rowcount} 筆來源已不存在的記錄")
+        return cursor.rowcount
+
+    def create_price_indexes(self, conn) -> None:
+        # 股價表的 (stock_code, date DESC) 複合索引，供最新股價查詢使用；
+        # 分割表的索引建立在 stock_prices 上，已涵蓋所有分割區
+        if self.storage == "partitioned":
+            return
+        cursor = conn.cursor()
+        for _, price_table in self.table_mapping.values():
+            cursor.execute(f"""
+                CREATE INDEX IF NOT EXISTS idx_{price_table}_stock_code_date
+                ON {price_table}(stock_code, date DESC);
+            """)
+        conn.commit()
+
+    def delete_stale_rows(self, conn) -> int:
+        # 只保留最新股價時，刪除已有較新日期的舊資料列，不提交交易
+        cursor = conn.cursor()
+        cursor.execute("""
+            DELETE FROM stock_all_industry_merge old
+            USING stock_all_industry_merge newer
+            WHERE old.stock_code = newer.stock_code
+              AND old.date < newer.date;
+        """)
+        logging.info(f"刪除 {cursor.rowcount} 筆舊股價資料列")
+        return cursor.rowcount
+
+    def load_merge_state(self, conn) -> Dict:
+        cursor = conn.cursor()
+        cursor.execute("SELECT industry_type, last_merged_at FROM stock_merge_state;")
+        return dict(cursor.fetchall())
+
+    def save_merge_state(self, conn, merged_at) -> None:
+        cursor = conn.cursor()
+        for industry in self.industries:
+            cursor.execute("""
+                INSERT INTO stock_merge_state (industry_type, last_merged_at)
+                VALUES (%s, %s)
+                ON CONFLICT (industry_type)
+                DO UPDATE SET last_merged_at = EXCLUDED.last_merged_at;
+            """, (industry, merged_at))
+
+    def create_indexes(self, conn, table_name: str = MERGED_TABLE, suffix: str = "") -> None:
         try:
             cursor = conn.cursor()
             
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_all_merge_stock_code 
-                ON stock_all_industry_merge(stock_code);
-                
-                CREATE INDEX IF NOT EXISTS idx_all_merge_industry_type 
-                ON stock_all_industry_merge(industry_type);
-                
-                CREATE INDEX IF NOT EXISTS idx_all_merge_date 
-                ON stock_all_industry_merge(date);
-            """)
+            for index_name, columns, unique, include in MERGED_INDEXES:
+                cursor.execute(f"""
+                    CREATE {"UNIQUE " if unique else ""}INDEX IF NOT EXISTS {index_name}{suffix}
+                    ON {table_name}({columns}){f" INCLUDE ({include})" if include else ""};
+                """)
             
             conn.commit()
             logging.info("成功創建索引")
@@ -124,21 +330,35 @@ class StockDataMerger:
             logging.error(f"創建索引時發生錯誤: {str(e)}")
             raise
 
-    def merge_all_data(self) -> None:
+    def merge_all_data(self, mode: str = "full", max_workers: int = 4, latest_only: bool = False) -> None:
+        # mode: 'full' 刪除並重建合併表；
+        #       'incremental' 保留合併表，只 upsert 來源資料有變動的資料列，合併期間資料表持續可查詢；
+        #       'shadow' 在影子表完整重建後，於單一交易中與正式表交換；
+        #       'matview' 以物化視圖取代合併表，之後以 REFRESH ... CONCURRENTLY 更新；
+        #       'parallel' 與 'shadow' 相同，但各產業以 max_workers 條連線同時載入影子表。
+        # latest_only 為 True 時每支股票只保留最新一筆股價，供儀表板顯示目前狀態
+        if mode not in ("full", "incremental", "shadow", "matview", "parallel"):
+            raise ValueError(f"不支援的合併模式: {mode}")
+        
         conn = None
         try:
             # 建立資料庫連線
             conn = psycopg2.connect(**self.db_params)
             
-            # 創建合併表
-            self.create_merged_table(conn)
+            self.latest_only = latest_only
+            if latest_only:
+                self.create_price_indexes(conn)
             
-            # 合併每個產業的資料
-            for industry in self.industries:
-                self.merge_industry_data(conn, industry)
-            
-            # 創建索引
-            self.create_indexes(conn)
+            if mode == "incremental":
+                self.merge_incremental(conn)
+            elif mode == "shadow":
+                self.merge_shadow(conn)
+            elif mode == "matview":
+                self.merge_matview(conn)
+            elif mode == "parallel":
+                self.merge_parallel(conn, max_workers=max_workers)
+            else:
+                self.merge_full(conn)
             
             logging.info("所有資料合併完成")
             
@@ -150,6 +370,224 @@ class StockDataMerger:
             if conn:
                 conn.close()
 
+    def current_timestamp(self, conn):
+        cursor = conn.cursor()
+        cursor.execute("SELECT LOCALTIMESTAMP;")
+        return cursor.fetchone()[0]
+
+    def merge_full(self, conn) -> None:
+        merged_at = self.current_timestamp(conn)
+        
+        # 創建合併表
+        self.create_merged_table(conn)
+        
+        # 合併每個產業的資料
+        for industry in self.industries:
+            self.merge_industry_data(conn, industry)
+        
+        # 創建索引
+        self.create_indexes(conn)
+        
+        # 記錄合併時間，並更新資料版本通知 API 端失效快取
+        self.save_merge_state(conn, merged_at)
+        bump_data_version(conn)
+        conn.commit()
+
+    def merge_incremental(self, conn) -> None:
+        if self.merged_relation_kind(conn) == "m":
+            # 物化視圖無法逐列 upsert，直接重新整理
+            logging.info(f"{MERGED_TABLE} 為物化視圖，改以重新整理取代增量合併")
+            self.merge_matview(conn)
+            return
+        
+        self.create_merged_table(conn, rebuild=False)
+        # 補上舊版合併表缺少的索引
+        self.create_indexes(conn)
+        
+        try:
+            merged_at = self.current_timestamp(conn)
+            merge_state = self.load_merge_state(conn)
+            
+            total_changed = 0
+            for industry in self.industries:
+                total_changed += self.merge_industry_incremental(conn, industry, merge_state.get(industry))
+                total_changed += self.delete_orphan_rows(conn, industry)
+            if self.latest_only:
+                total_changed += self.delete_stale_rows(conn)
+            
+            # 所有產業與合併時間在同一個交易中提交
+            self.save_merge_state(conn, merged_at)
+            if total_changed:
+                bump_data_version(conn)
+            conn.commit()
+            logging.info(f"增量合併完成，共更新 {total_changed} 筆記錄")
+            
+        except Exception:
+            conn.rollback()
+            raise
+
+    def build_shadow_table(self, conn) -> str:
+        # 在影子表載入所有產業，載入完成後才建立索引並更新統計資訊
+        shadow_table = f"{MERGED_TABLE}_shadow"
+        self.create_merged_table(conn, table_name=shadow_table)
+        
+        for industry in self.industries:
+            self.merge_industry_data(conn, industry, table_name=shadow_table, commit=False)
+        conn.commit()
+        
+        self.finish_shadow_table(conn, shadow_table)
+        return shadow_table
+
+    def finish_shadow_table(self, conn, shadow_table: str) -> None:
+        self.create_indexes(conn, table_name=shadow_table, suffix="_shadow")
+        
+        cursor = conn.cursor()
+        cursor.execute(f"ANALYZE {shadow_table};")
+        conn.commit()
+
+    def swap_shadow_table(self, conn, shadow_table: str, merged_at) -> None:
+        # 改名、刪除舊表、更新合併時間與資料版本都在同一個交易中完成，
+        # 讀取端只會看到舊表或新表
+        old_table = f"{MERGED_TABLE}_old"
+        try:
+            cursor = conn.cursor()
+            self.drop_merged_relation(conn, old_table)
+            if self.merged_relation_kind(conn) == "m":
+                cursor.execute(f"ALTER MATERIALIZED VIEW {MERGED_TABLE} RENAME TO {old_table};")
+            else:
+                cursor.execute(f"ALTER TABLE IF EXISTS {MERGED_TABLE} RENAME TO {old_table};")
+            cursor.execute(f"ALTER TABLE {shadow_table} RENAME TO {MERGED_TABLE};")
+            self.drop_merged_relation(conn, old_table)
+            
+            # 將影子表的主鍵、索引與序列改回正式名稱
+            cursor.execute(f"ALTER TABLE {MERGED_TABLE} RENAME CONSTRAINT {shadow_table}_pkey TO {MERGED_TABLE}_pkey;")
+            for index_name, *_ in MERGED_INDEXES:
+                cursor.execute(f"ALTER INDEX {index_name}_shadow RENAME TO {index_name};")
+            cursor.execute("SELECT pg_get_serial_sequence(%s, 'id');", (MERGED_TABLE,))
+            sequence_name = cursor.fetchone()[0]
+            cursor.execute(f"ALTER SEQUENCE {sequence_name} RENAME TO {MERGED_TABLE}_id_seq;")
+            
+            self.save_merge_state(conn, merged_at)
+            bump_data_version(conn)
+            conn.commit()
+            logging.info(f"影子表 {shadow_table} 已切換為 {MERGED_TABLE}")
+            
+        except Exception as e:
+            conn.rollback()
+            logging.error(f"切換影子表時發生錯誤: {str(e)}")
+            raise
+
+    def merge_shadow(self, conn) -> None:
+        merged_at = self.current_timestamp(conn)
+        
+        start_time = time.perf_counter()
+        shadow_table = self.build_shadow_table(conn)
+        logging.info(f"影子表載入完成，耗時 {time.perf_counter() - start_time:.3f} 秒")
+        
+        self.swap_shadow_table(conn, shadow_table, merged_at)
+
+    def merge_industry_pooled(self, pool, industry: str, table_name: str) -> float:
+        conn = pool.getconn()
+        try:
+            start_time = time.perf_counter()
+            self.merge_industry_data(conn, industry, table_name=table_name)
+            elapsed = time.perf_counter() - start_time
+            logging.info(f"{industry} 產業合併耗時 {elapsed:.3f} 秒")
+            return elapsed
+            
+        finally:
+            pool.putconn(conn)
+
+    def merge_parallel(self, conn, max_workers: int = 4) -> None:
+        # 各產業以連線池中各自的連線同時寫入影子表，全部成功才切換為正式表，
+        # 任一產業失敗就捨棄影子表，正式表維持不變
+        merged_at = self.current_timestamp(conn)
+        shadow_table = f"{MERGED_TABLE}_shadow"
+        self.create_merged_table(conn, table_name=shadow_table)
+        
+        start_time = time.perf_counter()
+        failed_industries = []
+        pool = ThreadedConnectionPool(1, max_workers, **self.db_params)
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {
+                    executor.submit(self.merge_industry_pooled, pool, industry, shadow_table): industry
+                    for industry in self.industries
+                }
+                
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                    except Exception:
+                        failed_industries.append(futures[future])
+            
+        finally:
+            pool.closeall()
+        
+        if failed_industries:
+            self.drop_merged_relation(conn, shadow_table)
+            conn.commit()
+            raise RuntimeError(f"產業 {', '.join(failed_industries)} 合併失敗，已捨棄影子表")
+        
+        logging.info(f"所有產業平行載入影子表完成，耗時 {time.perf_counter() - start_time:.3f} 秒")
+        self.finish_shadow_table(conn, shadow_table)
+        self.swap_shadow_table(conn, shadow_table, merged_at)
+
+    def create_merged_view(self, conn) -> None:
+        # 六個產業的 JOIN 以 UNION ALL 組成物化視圖，取代原本的實體合併表
+        try:
+            cursor = conn.cursor()
+            self.drop_merged_relation(conn)
+            
+            union_sql = "\n                UNION ALL\n".join(
+                f"({self.industry_select_sql(industry)})" for industry in self.industries
+            )
+            cursor.execute(f"""
+                CREATE MATERIALIZED VIEW {MERGED_TABLE} AS
+                {union_sql};
+            """, tuple(self.industries))
+            
+            # 唯一索引是 REFRESH ... CONCURRENTLY 的必要條件
+            self.create_indexes(conn)
+            logging.info(f"成功創建物化視圖 {MERGED_TABLE}")
+            
+        except Exception as e:
+            conn.rollback()
+            logging.error(f"創建物化視圖時發生錯誤: {str(e)}")
+            raise
+
+    def refresh_merged_view(self, conn) -> float:
+        # 重新整理期間讀取端仍可查詢舊資料，回傳耗時秒數
+        start_time = time.perf_counter()
+        cursor = conn.cursor()
+        cursor.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {MERGED_TABLE};")
+        elapsed = time.perf_counter() - start_time
+        logging.info(f"物化視圖 {MERGED_TABLE} 重新整理完成，耗時 {elapsed:.3f} 秒")
+        return elapsed
+
+    def merge_matview(self, conn) -> float:
+        merged_at = self.current_timestamp(conn)
+        
+        try:
+            if self.merged_relation_kind(conn) == "m":
+                elapsed = self.refresh_merged_view(conn)
+            else:
+                # 第一次建立時已包含資料，不需再重新整理
+                start_time = time.perf_counter()
+                self.create_merged_view(conn)
+                elapsed = time.perf_counter() - start_time
+                logging.info(f"物化視圖建立完成，耗時 {elapsed:.3f} 秒")
+            
+            self.create_merge_state_table(conn)
+            self.save_merge_state(conn, merged_at)
+            bump_data_version(conn)
+            conn.commit()
+            return elapsed
+            
+        except Exception:
+            conn.rollback()
+            raise
+
 def main():
     try:
         merger = StockDataMerger()
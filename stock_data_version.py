@@ -0,0 +1,52 @@
+import psycopg2
+import logging
+from datetime import datetime
+from typing import Optional, Tuple
+
+# 合併表資料版本：每次合併完成時遞增，並透過 NOTIFY 通知 API 端失效快取
+DATA_VERSION_CHANNEL = "stock_data_changed"
+MERGED_DATA_NAME = "stock_all_industry_merge"
+
+def create_version_table(conn) -> None:
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stock_data_version (
+            name VARCHAR(50) PRIMARY KEY,
+            version BIGINT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+def bump_data_version(conn, name: str = MERGED_DATA_NAME) -> int:
+    # 版本更新與 NOTIFY 都在呼叫端的交易中，提交後才會生效並送出通知
+    create_version_table(conn)
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO stock_data_version (name, version)
+        VALUES (%s, 1)
+        ON CONFLICT (name)
+        DO UPDATE SET
+            version = stock_data_version.version + 1,
+            updated_at = CURRENT_TIMESTAMP
+        RETURNING version;
+    """, (name,))
+    version = cursor.fetchone()[0]
+    cursor.execute("SELECT pg_notify(%s, %s);", (DATA_VERSION_CHANNEL, f"{name}:{version}"))
+    logging.info(f"資料版本 {name} 更新為 {version}")
+    return version
+
+def get_data_version(conn, name: str = MERGED_DATA_NAME) -> Tuple[int, Optional[datetime]]:
+    # 版本表尚未建立時視為版本 0
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT version, updated_at
+            FROM stock_data_version
+            WHERE name = %s;
+        """, (name,))
+    except psycopg2.errors.UndefinedTable:
+        conn.rollback()
+        return 0, None
+
+    row = cursor.fetchone()
+    return (row[0], row[1]) if row else (0, None)
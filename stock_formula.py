@@ -1,15 +1,36 @@
 import pandas as pd
+import numpy as np
 import psycopg2
-from typing import Dict, List
+from psycopg2.extras import execute_values
+from typing import Dict, List, Optional, Tuple
 from enum import Enum
+from industry_registry import INDUSTRIES
 
-class IndustryType(Enum):
-    FINANCIAL = "金融"
-    CONSTRUCTION = "營建"
-    SHIPPING = "航運"
-    SEMICONDUCTOR = "半導體"
-    ELECTRONIC = "電子零組件"
-    ETF = "ETF"
+IndustryType = Enum("IndustryType", [(industry.key, industry.name) for industry in INDUSTRIES])
+
+# 各產業的評價模型與合理價格區間倍數 (下限, 上限)
+VALUATION_MODELS = {
+    industry.name: (industry.valuation_model, *industry.multipliers) for industry in INDUSTRIES
+}
+
+# 本益比模型中 EPS 或本益比無效時，以 EPS×本益比 估算股價的上下倍數
+PE_FALLBACK_MULTIPLIERS = (0.8, 1.2)
+
+NOT_RATED = "不予評等"
+
+# 產業對應的資料表名稱映射
+VALUE_TABLES = {industry.name: industry.value_table for industry in INDUSTRIES}
+
+# 各產業資料表寫入的欄位 (stock_code 與合理價格欄位之外)
+VALUE_COLUMNS = {industry.name: industry.value_columns for industry in INDUSTRIES}
+
+DB_PARAMS = {
+    'dbname': 'stock_recommendation_system',
+    'user': 'test',
+    'password': '123456',
+    'host': 'localhost',
+    'port': '5433'
+}
 
 def create_tables(conn):
     
@@ -17,59 +38,42 @@ def create_tables(conn):
         try:
             cursor.execute(f"""
             ALTER TABLE {table_name}
-            ADD COLUMN IF NOT EXISTS fair_price_range VARCHAR(30)
+            ADD COLUMN IF NOT EXISTS fair_price_range VARCHAR(30),
+            ADD COLUMN IF NOT EXISTS fair_low FLOAT,
+            ADD COLUMN IF NOT EXISTS fair_high FLOAT,
+            ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            """)
+            # 合理價格上下限以數值欄位儲存，可直接用於區間篩選與評等計算
+            cursor.execute(f"""
+            CREATE INDEX IF NOT EXISTS idx_{table_name}_fair_low ON {table_name}(fair_low);
+            CREATE INDEX IF NOT EXISTS idx_{table_name}_fair_high ON {table_name}(fair_high);
             """)
         except Exception as e:
             print(f"添加欄位到 {table_name} 時發生錯誤: {str(e)}")
             raise
     cursor = conn.cursor()
     
-    # 金融業和營建業的表結構
-    for table_name in ["finance_value", "construction_value"]:
-        cursor.execute(f"""
-        CREATE TABLE IF NOT EXISTS {table_name} (
-            id SERIAL PRIMARY KEY,
-            stock_code VARCHAR(20) UNIQUE NOT NULL,
-            stock_name VARCHAR(50) NOT NULL,
-            avg_5_year_dividend_yield FLOAT,
-            net_value_per_share FLOAT,
-            book_to_net_value_ratio FLOAT,
-            fair_price_range VARCHAR(30),
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    # 表結構依產業的評價模型決定數值欄位
+    for industry in INDUSTRIES:
+        metric_columns = "".join(
+            f"\n            {column} FLOAT," for column in industry.metric_columns
         )
-        """)
-    
-    # 航運業、半導體和電子零組件的表結構
-    for table_name in ["shipping_value", "semiconductor_value", "electronic_components_value"]:
         cursor.execute(f"""
-        CREATE TABLE IF NOT EXISTS {table_name} (
+        CREATE TABLE IF NOT EXISTS {industry.value_table} (
             id SERIAL PRIMARY KEY,
             stock_code VARCHAR(20) UNIQUE NOT NULL,
             stock_name VARCHAR(50) NOT NULL,
-            avg_5_year_dividend_yield FLOAT,
-            earnings_per_share FLOAT,
-            price_to_earnings_ratio FLOAT,
+            avg_5_year_dividend_yield FLOAT,{metric_columns}
             fair_price_range VARCHAR(30),
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            fair_low FLOAT,
+            fair_high FLOAT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
         """)
     
-    # ETF的表結構
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS etf_value (
-        id SERIAL PRIMARY KEY,
-        stock_code VARCHAR(20) UNIQUE NOT NULL,
-        stock_name VARCHAR(50) NOT NULL,
-        avg_5_year_dividend_yield FLOAT,
-        net_asset_value_per_etf FLOAT,
-        fair_price_range VARCHAR(30),
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    """)
-    
-    # 為所有資料表添加合理價格區間欄位
-    for table_name in ["finance_value", "construction_value", "shipping_value", 
-                      "semiconductor_value", "electronic_components_value", "etf_value"]:
+    # 為所有資料表添加合理價格區間欄位與索引
+    for table_name in VALUE_TABLES.values():
         add_fair_price_range_column(cursor, table_name)
     
     conn.commit()
@@ -81,49 +85,7 @@ def read_excel_data(file_path: str, sheet_name: str) -> List[Dict]:
         df = pd.read_excel(file_path, sheet_name=sheet_name)
         
         # 根據不同頁籤設定不同的欄位映射
-        column_mappings = {
-            '金融': {
-                '股票代碼': 'stock_code',
-                '股票名稱': 'stock_name',
-                '近5年平均殖利率': 'avg_5_year_dividend_yield',
-                '每股淨值': 'net_value_per_share',
-                '股淨比': 'book_to_net_value_ratio'
-            },
-            '營建': {
-                '股票代碼': 'stock_code',
-                '股票名稱': 'stock_name',
-                '近5年平均殖利率': 'avg_5_year_dividend_yield',
-                '每股淨值': 'net_value_per_share',
-                '股淨比': 'book_to_net_value_ratio'
-            },
-            '航運': {
-                '股票代碼': 'stock_code',
-                '股票名稱': 'stock_name',
-                '近5年平均殖利率': 'avg_5_year_dividend_yield',
-                '每股盈餘': 'earnings_per_share',
-                '本益比': 'price_to_earnings_ratio'
-            },
-            '半導體': {
-                '股票代碼': 'stock_code',
-                '股票名稱': 'stock_name',
-                '近5年平均殖利率': 'avg_5_year_dividend_yield',
-                '每股盈餘': 'earnings_per_share',
-                '本益比': 'price_to_earnings_ratio'
-            },
-            '電子零組件': {
-                '股票代碼': 'stock_code',
-                '股票名稱': 'stock_name',
-                '近5年平均殖利率': 'avg_5_year_dividend_yield',
-                '每股盈餘': 'earnings_per_share',
-                '本益比': 'price_to_earnings_ratio'
-            },
-            'ETF': {
-                '股票代碼': 'stock_code',
-                '股票名稱': 'stock_name',
-                '近5年平均殖利率': 'avg_5_year_dividend_yield',
-                'ETF淨值': 'net_asset_value_per_etf'
-            }
-        }
+        column_mappings = {industry.name: industry.column_map for industry in INDUSTRIES}
         
         # 重新命名欄位
         if sheet_name in column_mappings:
@@ -143,167 +105,116 @@ def read_excel_data(file_path: str, sheet_name: str) -> List[Dict]:
         print(f"讀取Excel檔案錯誤: {str(e)}")
         return []
 
-def save_to_database(stocks_data: List[Dict], industry_type: str):
-    conn = None
+def round_prices(values: np.ndarray) -> np.ndarray:
+    # np.round 在剛好落在半分附近時可能與 Python round 相差一分，
+    # 這些少數元素改以 Python round 計算，確保與逐筆計算結果一致
+    rounded = np.round(values, 2)
+    scaled = values * 100
+    ambiguous = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    for i in np.flatnonzero(ambiguous):
+        rounded[i] = round(float(values[i]), 2)
+    return rounded
+
+def compute_fair_price_bounds(df: pd.DataFrame, industry_type: str,
+                              multipliers: Optional[Tuple[float, float]] = None) -> pd.DataFrame:
+    # 以欄位運算一次算出所有股票的合理價格上下限，
+    # multipliers 可覆寫產業預設倍數，用於情境試算
+    if industry_type not in VALUATION_MODELS:
+        raise ValueError(f"未支援的產業類型: {industry_type}")
+    
+    model, low_mult, high_mult = VALUATION_MODELS[industry_type]
+    if multipliers is not None:
+        low_mult, high_mult = multipliers
+    
+    def column(name):
+        if name not in df:
+            return np.full(len(df), np.nan)
+        return pd.to_numeric(df[name], errors='coerce').to_numpy(dtype=float)
+    
+    if model == "pb":
+        bps = column('net_value_per_share')
+        current_pb = column('book_to_net_value_ratio')
+        low_price = round_prices(bps * (current_pb * low_mult))
+        high_price = round_prices(bps * (current_pb * high_mult))
+        
+    elif model == "pe":
+        eps = column('earnings_per_share')
+        current_pe = column('price_to_earnings_ratio')
+        valid = (eps != 0) & (current_pe > 0)
+        
+        # EPS 或本益比無效時，改以 EPS×本益比 作為股價估計
+        current_price = np.where((eps != 0) & (current_pe != 0), eps * current_pe, 0)
+        fallback_low, fallback_high = PE_FALLBACK_MULTIPLIERS
+        fallback = current_price > 0
+        
+        low_price = np.where(valid, round_prices(eps * (current_pe * low_mult)),
+                             np.where(fallback, round_prices(current_price * fallback_low), 0))
+        high_price = np.where(valid, round_prices(eps * (current_pe * high_mult)),
+                              np.where(fallback, round_prices(current_price * fallback_high), 0))
+        
+    else:  # nav
+        nav = column('net_asset_value_per_etf')
+        valid = nav > 0
+        low_price = np.where(valid, round_prices(nav * low_mult), 0)
+        high_price = np.where(valid, round_prices(nav * high_mult), 0)
+    
+    rated = (low_price > 0) & (high_price > 0)
+    result = pd.DataFrame({
+        'fair_low': np.where(rated, low_price, np.nan),
+        'fair_high': np.where(rated, high_price, np.nan),
+    }, index=df.index)
+    result['fair_price_range'] = (
+        result['fair_low'].astype(str) + " ~ " + result['fair_high'].astype(str)
+    ).where(rated, NOT_RATED)
+    return result
+
+def save_to_database(stocks_data: List[Dict], industry_type: str, conn=None):
+    # 傳入 conn 時沿用呼叫端的連線，由呼叫端負責關閉
+    owns_connection = conn is None
     try:
-        conn = psycopg2.connect(
-            dbname="stock_recommendation_system",
-            user="test",
-            password="123456",
-            host="localhost",
-            port="5433"
-        )
+        if owns_connection:
+            conn = psycopg2.connect(**DB_PARAMS)
         cursor = conn.cursor()
-
-        # 產業對應的資料表名稱映射
-        table_mapping = {
-            "金融": "finance_value",
-            "營建": "construction_value",
-            "航運": "shipping_value",
-            "半導體": "semiconductor_value",
-            "電子零組件": "electronic_components_value",
-            "ETF": "etf_value"
-        }
         
-        table_name = table_mapping.get(industry_type)
+        table_name = VALUE_TABLES.get(industry_type)
         if not table_name:
             raise ValueError(f"未支援的產業類型: {industry_type}")
 
-        for stock in stocks_data:
-            fair_price_range = None
-            
-            if industry_type in ['金融', '營建']:
-                # 使用個股的淨值和本淨比計算
-                bps = stock['net_value_per_share']
-                current_pb = stock['book_to_net_value_ratio']
-                
-                if industry_type == '金融':
-                    pb_low = current_pb * 0.8
-                    pb_high = current_pb * 1.2
-                else:  # 營建
-                    pb_low = current_pb * 0.7
-                    pb_high = current_pb * 1.1
-                    
-                low_price = round(bps * pb_low, 2)
-                high_price = round(bps * pb_high, 2)
-                
-            elif industry_type in ['航運', '半導體', '電子零組件']:
-                # 使用個股的EPS和本益比計算
-                eps = stock['earnings_per_share']
-                current_pe = stock['price_to_earnings_ratio']
-                
-                if eps and current_pe and eps != 0 and current_pe > 0:
-                    if industry_type == '航運':
-                        pe_low = current_pe * 0.6
-                        pe_high = current_pe * 0.9
-                    else:  # 半導體和電子零組件
-                        pe_low = current_pe * 0.8
-                        pe_high = current_pe * 1.2
-                        
-                    low_price = round(eps * pe_low, 2)
-                    high_price = round(eps * pe_high, 2)
-                else:
-                    current_price = eps * current_pe if eps and current_pe else 0
-                    if current_price > 0:
-                        low_price = round(current_price * 0.8, 2)
-                        high_price = round(current_price * 1.2, 2)
-                    else:
-                        low_price = high_price = 0
-                
-            else:  # ETF
-                nav = stock['net_asset_value_per_etf']
-                if nav and nav > 0:
-                    low_price = round(nav * 0.98, 2)
-                    high_price = round(nav * 1.02, 2)
-                else:
-                    low_price = high_price = 0
-
-            # 設定合理價格區間字串
-            if low_price > 0 and high_price > 0:
-                fair_price_range = f"{low_price} ~ {high_price}"
-            else:
-                fair_price_range = "不予評等"
+        # 一次計算整個產業的合理價格區間
+        fair_prices = compute_fair_price_bounds(pd.DataFrame(stocks_data), industry_type)
 
-            if industry_type in ['金融', '營建']:
-                upsert_sql = f"""
-                INSERT INTO {table_name} (
-                    stock_code, 
-                    stock_name, 
-                    avg_5_year_dividend_yield,
-                    net_value_per_share,
-                    book_to_net_value_ratio,
-                    fair_price_range
-                ) VALUES (%s, %s, %s, %s, %s, %s)
-                ON CONFLICT (stock_code) 
-                DO UPDATE SET 
-                    stock_name = EXCLUDED.stock_name,
-                    avg_5_year_dividend_yield = EXCLUDED.avg_5_year_dividend_yield,
-                    net_value_per_share = EXCLUDED.net_value_per_share,
-                    book_to_net_value_ratio = EXCLUDED.book_to_net_value_ratio,
-                    fair_price_range = EXCLUDED.fair_price_range
-                """
-                values = (
-                    stock['stock_code'],
-                    stock['stock_name'],
-                    stock['avg_5_year_dividend_yield'],
-                    stock['net_value_per_share'],
-                    stock['book_to_net_value_ratio'],
-                    fair_price_range
-                )
-            elif industry_type in ['航運', '半導體', '電子零組件']:
-                upsert_sql = f"""
-                INSERT INTO {table_name} (
-                    stock_code,
-                    stock_name,
-                    avg_5_year_dividend_yield,
-                    earnings_per_share,
-                    price_to_earnings_ratio,
-                    fair_price_range
-                ) VALUES (%s, %s, %s, %s, %s, %s)
-                ON CONFLICT (stock_code) 
-                DO UPDATE SET 
-                    stock_name = EXCLUDED.stock_name,
-                    avg_5_year_dividend_yield = EXCLUDED.avg_5_year_dividend_yield,
-                    earnings_per_share = EXCLUDED.earnings_per_share,
-                    price_to_earnings_ratio = EXCLUDED.price_to_earnings_ratio,
-                    fair_price_range = EXCLUDED.fair_price_range
-                """
-                values = (
-                    stock['stock_code'],
-                    stock['stock_name'],
-                    stock['avg_5_year_dividend_yield'],
-                    stock['earnings_per_share'],
-                    stock['price_to_earnings_ratio'],
-                    fair_price_range
-                )
-            else:  # ETF
-                upsert_sql = f"""
-                INSERT INTO {table_name} (
-                    stock_code,
-                    stock_name,
-                    avg_5_year_dividend_yield,
-                    net_asset_value_per_etf,
-                    fair_price_range
-                ) VALUES (%s, %s, %s, %s, %s)
-                ON CONFLICT (stock_code) 
-                DO UPDATE SET 
-                    stock_name = EXCLUDED.stock_name,
-                    avg_5_year_dividend_yield = EXCLUDED.avg_5_year_dividend_yield,
-                    net_asset_value_per_etf = EXCLUDED.net_asset_value_per_etf,
-                    fair_price_range = EXCLUDED.fair_price_range
-                """
-                values = (
-                    stock['stock_code'],
-                    stock['stock_name'],
-                    stock['avg_5_year_dividend_yield'],
-                    stock['net_asset_value_per_etf'],
-                    fair_price_range
-                )
-            
-            cursor.execute(upsert_sql, values)
+        # 同一股票代碼重複出現時保留最後一筆，避免同一批次重複更新同一列
+        value_columns = VALUE_COLUMNS[industry_type]
+        fair_prices = fair_prices.astype(object).where(fair_prices.notna(), None)
+        rows = {}
+        for stock, fair in zip(stocks_data, fair_prices.itertuples(index=False)):
+            rows[stock['stock_code']] = (
+                (stock['stock_code'],)
+                + tuple(stock[column] for column in value_columns)
+                + (fair.fair_price_range, fair.fair_low, fair.fair_high)
+            )
+        
+        columns = ["stock_code"] + value_columns + ["fair_price_range", "fair_low", "fair_high"]
+        update_columns = ",\n                ".join(
+            f"{column} = EXCLUDED.{column}" for column in columns[1:]
+        )
+        # 只有內容實際變動時才更新，並記錄 updated_at 供增量合併判斷
+        upsert_sql = f"""
+            INSERT INTO {table_name} ({", ".join(columns)})
+            VALUES %s
+            ON CONFLICT (stock_code)
+            DO UPDATE SET
+                {update_columns},
+                updated_at = CURRENT_TIMESTAMP
+            WHERE ({", ".join(f"{table_name}.{column}" for column in columns[1:])})
+                IS DISTINCT FROM ({", ".join(f"EXCLUDED.{column}" for column in columns[1:])})
+        """
+        
+        # 整個產業以單一多列 upsert 寫入
+        execute_values(cursor, upsert_sql, list(rows.values()), page_size=max(len(rows), 1))
         
         conn.commit()
-        print(f"成功儲存 {industry_type} 產業的數據")
+        print(f"成功儲存 {industry_type} 產業的數據，共 {len(rows)} 筆")
         
     except Exception as e:
         if conn:
@@ -311,23 +222,31 @@ def save_to_database(stocks_data: List[Dict], industry_type: str):
         print(f"保存到資料庫時發生錯誤: {str(e)}")
         
     finally:
-        if conn:
+        if owns_connection and conn:
             conn.close()
 
 def main():
     excel_file = "/Users/tommy/Desktop/資料庫/資料庫.xlsx"
     
-    for industry in IndustryType:
-        print(f"\n處理 {industry.value} 產業數據...")
-        
-        stocks_data = read_excel_data(excel_file, industry.value)
-        if not stocks_data:
-            continue
+    # 所有產業共用同一條資料庫連線
+    conn = psycopg2.connect(**DB_PARAMS)
+    try:
+        # 先補齊舊版資料表缺少的 fair_low、fair_high、updated_at 等欄位，寫入時才不會失敗
+        create_tables(conn)
+
+        for industry in IndustryType:
+            print(f"\n處理 {industry.value} 產業數據...")
             
+            stocks_data = read_excel_data(excel_file, industry.value)
+            if not stocks_data:
+                continue
+                
 
-        save_to_database(stocks_data, industry.value)
-        
-        print(f"已完成 {industry.value} 產業的資料處理")
+            save_to_database(stocks_data, industry.value, conn=conn)
+            
+            print(f"已完成 {industry.value} 產業的資料處理")
+    finally:
+        conn.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
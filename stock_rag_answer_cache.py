@@ -0,0 +1,134 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from db_pool import get_pool
+from stock_data_version import get_data_version
+
+# 回答快取設定：餘弦相似度達門檻才視為同一個問題
+ANSWER_CACHE_THRESHOLD = 0.95
+ANSWER_CACHE_TTL_SECONDS = 3600
+ANSWER_CACHE_MAX_ENTRIES = 512
+# 檢查資料版本的最短間隔秒數
+VERSION_CHECK_INTERVAL = 30
+
+def db_version_source() -> Callable[[], int]:
+    # 以合併表的資料版本判斷回答是否過期
+    def current_version() -> int:
+        with get_pool().connection() as conn:
+            return get_data_version(conn)[0]
+    return current_version
+
+def faiss_db_version_source(db_dir: str) -> Callable[[], Optional[int]]:
+    # 無法連線資料庫時 (例如 Colab)，以 faiss_db 索引檔的修改時間代表資料版本
+    def current_version() -> Optional[int]:
+        path = os.path.join(db_dir, "index.faiss")
+        return os.stat(path).st_mtime_ns if os.path.exists(path) else None
+    return current_version
+
+class SemanticAnswerCache:
+    # 以問題向量為鍵的回答快取：與已快取問題的相似度達門檻，且 scope (例如問題中的股票與指標) 相同時直接回傳先前的回答；
+    # 超過 TTL 或資料版本變更時失效，超過容量時淘汰最久未使用的項目
+    def __init__(self, embedding: Embeddings, threshold: float = ANSWER_CACHE_THRESHOLD,
+                 ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS, max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+                 version_source: Optional[Callable[[], Hashable]] = None,
+                 version_check_interval: float = VERSION_CHECK_INTERVAL):
+        self.embedding = embedding
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.version_source = version_source
+        self.version_check_interval = version_check_interval
+        self.version = None
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+        # 正規化後的問題向量依槽位存放；槽位 -> (到期時間, scope, 問題, 回答)，越後面越近期使用
+        self._vectors = None
+        self._entries = OrderedDict()
+        self._free_slots = list(range(max_entries))
+        self._version_checked_at = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def embed(self, question: str) -> np.ndarray:
+        vector = np.asarray(self.embedding.embed_query(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def check_version(self) -> None:
+        if self.version_source is None:
+            return
+        now = time.monotonic()
+        if self._version_checked_at is not None and now - self._version_checked_at < self.version_check_interval:
+            return
+        self._version_checked_at = now
+
+        try:
+            version = self.version_source()
+        except Exception as e:
+            logging.error(f"取得資料版本時發生錯誤: {str(e)}")
+            return
+        if version != self.version:
+            if self.version is not None:
+                logging.info(f"資料版本由 {self.version} 變更為 {version}，清空回答快取")
+            self.invalidate()
+            self.version = version
+
+    def remove_expired(self, now: float) -> None:
+        expired = [slot for slot, (expires_at, _, _, _) in self._entries.items() if expires_at < now]
+        for slot in expired:
+            del self._entries[slot]
+            self._free_slots.append(slot)
+
+    def lookup(self, question: str, scope: Hashable = None) -> Tuple[Optional[str], np.ndarray]:
+        # 回傳 (快取的回答或 None, 問題向量)，未命中時呼叫端以同一個向量寫入回答
+        self.check_version()
+        vector = self.embed(question)
+
+        with self._lock:
+            self.remove_expired(time.monotonic())
+            candidates = [slot for slot, (_, entry_scope, _, _) in self._entries.items() if entry_scope == scope]
+            if candidates:
+                similarities = self._vectors[candidates] @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    slot = candidates[best]
+                    self._entries.move_to_end(slot)
+                    self.hits += 1
+                    return self._entries[slot][3], vector
+            self.misses += 1
+            return None, vector
+
+    def store(self, vector: np.ndarray, question: str, answer: str, scope: Hashable = None,
+              generation: Optional[int] = None) -> None:
+        with self._lock:
+            # 產生回答期間若已失效過，回答可能依據舊資料，不寫入快取
+            if generation is not None and generation != self.generation:
+                return
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+
+            self.remove_expired(time.monotonic())
+            if self._free_slots:
+                slot = self._free_slots.pop()
+            else:
+                slot, _ = self._entries.popitem(last=False)
+
+            self._vectors[slot] = vector
+            self._entries[slot] = (time.monotonic() + self.ttl_seconds, scope, question, answer)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._free_slots = list(range(self.max_entries))
+            self.generation += 1
@@ -0,0 +1,117 @@
+import os
+import time
+import logging
+import tempfile
+from typing import Dict, List, Tuple
+
+import numpy as np
+import faiss
+
+from stock_rag_index import DEFAULT_INDEX_PARAMS, MAX_TRAIN_SIZE, create_index
+
+# 以合成語料比較各索引類型相對於 flat 精確搜尋的 recall@k 與單筆查詢延遲。
+# 向量維度與 multilingual-e5-small 相同，語料以高斯混合產生，模擬段落向量成群分布的情況
+BENCHMARK_SIZES = [int(n) for n in os.environ.get("STOCK_RAG_BENCHMARK_SIZES", "10000,100000,1000000").split(",")]
+BENCHMARK_DIM = 384
+BENCHMARK_QUERIES = 1000
+BENCHMARK_K = 10
+BENCHMARK_CLUSTERS = 200
+GENERATE_CHUNK_SIZE = 100000
+
+# 各索引類型要比較的搜尋參數
+SEARCH_SWEEPS = {
+    "ivf_flat": ("nprobe", [1, 4, 16, 64]),
+    "ivf_pq": ("nprobe", [1, 4, 16, 64]),
+    "hnsw": ("efSearch", [16, 64, 256])
+}
+
+def make_corpus(n: int, dim: int, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    # 分段產生語料，查詢取自語料中的點再加上雜訊
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((BENCHMARK_CLUSTERS, dim)).astype(np.float32)
+    corpus = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, GENERATE_CHUNK_SIZE):
+        end = min(start + GENERATE_CHUNK_SIZE, n)
+        labels = rng.integers(0, BENCHMARK_CLUSTERS, end - start)
+        corpus[start:end] = centers[labels] + 0.5 * rng.standard_normal((end - start, dim), dtype=np.float32)
+
+    picks = rng.choice(n, min(BENCHMARK_QUERIES, n), replace=False)
+    queries = corpus[picks] + 0.1 * rng.standard_normal((len(picks), dim), dtype=np.float32)
+    return corpus, queries.astype(np.float32)
+
+def build_index(index_type: str, corpus: np.ndarray):
+    # 與 StockIndexBuilder 相同，最多取 MAX_TRAIN_SIZE 筆向量訓練
+    start = time.perf_counter()
+    n_train = min(len(corpus), MAX_TRAIN_SIZE)
+    index = create_index(index_type, corpus.shape[1], n_train, DEFAULT_INDEX_PARAMS)
+    if not index.is_trained:
+        index.train(corpus[:n_train])
+    index.add(corpus)
+    return index, time.perf_counter() - start
+
+def index_size_mb(index) -> float:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "index.faiss")
+        faiss.write_index(index, path)
+        return os.path.getsize(path) / 1024 / 1024
+
+def measure(index, queries: np.ndarray, ground_truth: np.ndarray, k: int) -> Dict:
+    # 聊天機器人一次只查一筆，延遲以單筆查詢計算
+    latencies = []
+    found = np.empty((len(queries), k), dtype=np.int64)
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, ids = index.search(query.reshape(1, -1), k)
+        latencies.append(time.perf_counter() - start)
+        found[i] = ids[0]
+
+    recall = np.mean([len(set(row) & set(truth)) / k for row, truth in zip(found, ground_truth)])
+    return {
+        "recall": float(recall),
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000)
+    }
+
+def benchmark(n: int, k: int = BENCHMARK_K) -> List[Dict]:
+    logging.info(f"產生 {n} 筆合成語料")
+    corpus, queries = make_corpus(n, BENCHMARK_DIM)
+    results = []
+
+    flat, build_seconds = build_index("flat", corpus)
+    _, ground_truth = flat.search(queries, k)
+    results.append({"n": n, "index_type": "flat", "param": "-", "build_s": build_seconds,
+                    "size_mb": index_size_mb(flat), **measure(flat, queries, ground_truth, k)})
+    del flat
+
+    # 一次只保留一個索引，降低百萬筆時的記憶體用量
+    for index_type, (param, values) in SEARCH_SWEEPS.items():
+        logging.info(f"建立 {index_type} 索引 ({n} 筆)")
+        index, build_seconds = build_index(index_type, corpus)
+        size_mb = index_size_mb(index)
+        for value in values:
+            faiss.ParameterSpace().set_index_parameter(index, param, value)
+            results.append({"n": n, "index_type": index_type, "param": f"{param}={value}",
+                            "build_s": build_seconds, "size_mb": size_mb,
+                            **measure(index, queries, ground_truth, k)})
+        del index
+    return results
+
+def print_results(results: List[Dict], k: int = BENCHMARK_K) -> None:
+    print(f"{'語料數':>9} {'索引類型':<9} {'搜尋參數':<13} {'建置(秒)':>9} {'大小(MB)':>9} "
+          f"{f'recall@{k}':>10} {'p50(ms)':>8} {'p99(ms)':>8}")
+    for row in results:
+        print(f"{row['n']:>9} {row['index_type']:<9} {row['param']:<13} {row['build_s']:>9.2f} "
+              f"{row['size_mb']:>9.1f} {row['recall']:>10.3f} {row['p50_ms']:>8.3f} {row['p99_ms']:>8.3f}")
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    results = []
+    for n in BENCHMARK_SIZES:
+        results.extend(benchmark(n))
+    print_results(results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+import os
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_community.embeddings import HuggingFaceEmbeddings
+
+E5_MODEL_NAME = "intfloat/multilingual-e5-small"
+
+# 嵌入向量快取設定
+EMBEDDING_CACHE_DIR = "embedding_cache"
+EMBEDDING_CACHE_CAPACITY = 100000
+EMBEDDING_BATCH_SIZE = 64
+
+class EmbeddingCache:
+    # 以內容雜湊為鍵的磁碟快取：向量存於 float32 memmap，
+    # 鍵與槽位的對應及最近使用順序存於 SQLite (index.db)，每次只寫入變動的鍵，容量滿時覆寫最久未使用的槽位
+    def __init__(self, cache_dir: str, namespace: str, capacity: int = EMBEDDING_CACHE_CAPACITY):
+        self.cache_dir = cache_dir
+        self.namespace = namespace
+        self.capacity = capacity
+        self.vectors_path = os.path.join(cache_dir, "vectors.f32")
+        self.index_path = os.path.join(cache_dir, "index.db")
+        self.dim = None
+        self._vectors = None
+        # 鍵 -> 槽位，越後面越近期使用
+        self._slots = OrderedDict()
+        self._free_slots = list(range(capacity - 1, -1, -1))
+        # 遞增的使用序號，寫入 last_used 以便重新載入時還原 LRU 順序
+        self._clock = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._db = sqlite3.connect(self.index_path, check_same_thread=False)
+        # WAL 模式下提交不需每次同步整個檔案，命中時更新使用順序的成本很低
+        self._db.execute("PRAGMA journal_mode=WAL;")
+        self._db.execute("PRAGMA synchronous=NORMAL;")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT);")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                slot INTEGER NOT NULL UNIQUE,
+                last_used INTEGER NOT NULL
+            );
+        """)
+        self._db.commit()
+        self._load()
+
+    def _load(self) -> None:
+        meta = dict(self._db.execute("SELECT name, value FROM meta;").fetchall())
+        if not meta or not os.path.exists(self.vectors_path):
+            return
+
+        # 模型或容量不同時捨棄舊快取，之後寫入會重新建立
+        if meta.get("namespace") != self.namespace or int(meta.get("capacity", 0)) != self.capacity:
+            logging.info(f"嵌入快取 {self.cache_dir} 設定已變更，重新建立快取")
+            return
+
+        self.dim = int(meta["dim"])
+        self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r+",
+                                  shape=(self.capacity, self.dim))
+        rows = self._db.execute("SELECT key, slot, last_used FROM entries ORDER BY last_used;").fetchall()
+        self._slots = OrderedDict((key, slot) for key, slot, _ in rows)
+        used = set(self._slots.values())
+        self._free_slots = [slot for slot in range(self.capacity - 1, -1, -1) if slot not in used]
+        self._clock = rows[-1][2] if rows else 0
+        logging.info(f"載入嵌入快取 {self.cache_dir}，共 {len(self._slots)} 筆")
+
+    def _reset(self, dim: int) -> None:
+        self.dim = dim
+        self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="w+",
+                                  shape=(self.capacity, self.dim))
+        self._slots.clear()
+        self._free_slots = list(range(self.capacity - 1, -1, -1))
+        self._clock = 0
+        with self._db:
+            self._db.execute("DELETE FROM entries;")
+            self._db.execute("DELETE FROM meta;")
+            self._db.executemany("INSERT INTO meta (name, value) VALUES (?, ?);", [
+                ("namespace", self.namespace), ("capacity", str(self.capacity)), ("dim", str(dim))
+            ])
+
+    def _tick(self) -> int:
+        self._clock += 1
+        return self._clock
+
+    def make_key(self, text: str) -> str:
+        return hashlib.sha1(f"{self.namespace}\n{text}".encode("utf-8")).hexdigest()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[np.ndarray]]:
+        with self._lock:
+            results = []
+            touched = []
+            for key in keys:
+                slot = self._slots.get(key)
+                if slot is None:
+                    results.append(None)
+                    continue
+                self._slots.move_to_end(key)
+                touched.append((self._tick(), key))
+                results.append(np.array(self._vectors[slot]))
+
+            if touched:
+                with self._db:
+                    self._db.executemany("UPDATE entries SET last_used = ? WHERE key = ?;", touched)
+            return results
+
+    def put_many(self, keys: Sequence[str], vectors: Sequence[Sequence[float]]) -> None:
+        if not keys:
+            return
+
+        with self._lock:
+            if self._vectors is None:
+                self._reset(len(vectors[0]))
+
+            for vector in vectors:
+                if len(vector) != self.dim:
+                    raise ValueError(f"向量維度 {len(vector)} 與快取維度 {self.dim} 不符")
+
+            assigned = OrderedDict()
+            writes = []
+            evicted = []
+            for key, vector in zip(keys, vectors):
+                if key in self._slots:
+                    slot = self._slots[key]
+                    self._slots.move_to_end(key)
+                elif self._free_slots:
+                    slot = self._free_slots.pop()
+                    self._slots[key] = slot
+                else:
+                    evicted_key, slot = self._slots.popitem(last=False)
+                    evicted.append((evicted_key,))
+                    assigned.pop(evicted_key, None)
+                    self._slots[key] = slot
+
+                writes.append((slot, vector))
+                assigned[key] = (slot, self._tick())
+
+            # 先提交被淘汰鍵的刪除再覆寫向量，中斷時不會留下指向其他文字向量的鍵
+            if evicted:
+                with self._db:
+                    self._db.executemany("DELETE FROM entries WHERE key = ?;", evicted)
+            for slot, vector in writes:
+                self._vectors[slot] = vector
+            self._vectors.flush()
+            with self._db:
+                self._db.executemany("""
+                    INSERT INTO entries (key, slot, last_used) VALUES (?, ?, ?)
+                    ON CONFLICT (key) DO UPDATE SET slot = excluded.slot, last_used = excluded.last_used;
+                """, [(key, slot, last_used) for key, (slot, last_used) in assigned.items()])
+
+    def flush(self) -> None:
+        # 使用順序在每次存取時已寫入，這裡只確保 WAL 內容併回主檔
+        with self._lock:
+            self._db.execute("PRAGMA wal_checkpoint(PASSIVE);")
+
+class CachedE5Embedding(Embeddings):
+    # E5 模型需在文字前加上 "passage: " / "query: " 前綴；
+    # 相同文字的向量直接由磁碟快取取得，未命中的文字去除重複後整批編碼
+    def __init__(self, model_name: str = E5_MODEL_NAME, cache_dir: Optional[str] = EMBEDDING_CACHE_DIR,
+                 capacity: int = EMBEDDING_CACHE_CAPACITY, batch_size: int = EMBEDDING_BATCH_SIZE,
+                 embeddings: Optional[Embeddings] = None, **kwargs):
+        encode_kwargs = kwargs.pop("encode_kwargs", {})
+        encode_kwargs.setdefault("batch_size", batch_size)
+        self.embeddings = embeddings or HuggingFaceEmbeddings(
+            model_name=model_name, encode_kwargs=encode_kwargs, **kwargs
+        )
+
+        # 是否正規化會改變向量，納入快取的命名空間
+        namespace = f"{model_name}:normalize={bool(encode_kwargs.get('normalize_embeddings', False))}"
+        self.cache = EmbeddingCache(cache_dir, namespace, capacity) if cache_dir else None
+        self.hits = 0
+        self.misses = 0
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        if self.cache is None:
+            return self.embeddings.embed_documents(texts)
+
+        keys = [self.cache.make_key(text) for text in texts]
+        cached = self.cache.get_many(keys)
+
+        missing = OrderedDict()
+        for key, text, vector in zip(keys, texts, cached):
+            if vector is None:
+                missing.setdefault(key, text)
+
+        computed = {}
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            self.cache.put_many(list(missing), vectors)
+            computed = dict(zip(missing, vectors))
+
+        self.hits += len(texts) - sum(vector is None for vector in cached)
+        self.misses += len(missing)
+        return [
+            vector.tolist() if vector is not None else list(computed[key])
+            for key, vector in zip(keys, cached)
+        ]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed([f"passage: {text}" for text in texts])
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([f"query: {text}"])[0]
@@ -0,0 +1,347 @@
+import os
+import json
+import pickle
+import shutil
+import math
+import hashlib
+import logging
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import faiss
+import psycopg2
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_community.docstore.in_memory import InMemoryDocstore
+
+from db_pool import DB_PARAMS
+from industry_registry import INDUSTRIES, Industry
+from stock_rag_embedding import E5_MODEL_NAME, CachedE5Embedding
+
+FAISS_DB_DIR = "faiss_db"
+BUILD_STATE_FILE = "build_state.json"
+
+# 伺服器端游標每次取回的筆數，以及每批編碼的段落數
+STREAM_BATCH_SIZE = 1000
+EMBED_BATCH_SIZE = 256
+
+# 索引類型：flat 為精確搜尋 (預設)；ivf_flat / ivf_pq 先以樣本訓練分群，搜尋時只掃描 nprobe 個分群，
+# ivf_pq 另以乘積量化壓縮向量；hnsw 為圖索引，不需訓練但不支援移除向量
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+INDEX_TYPE = os.environ.get("STOCK_RAG_INDEX_TYPE", "flat")
+
+# nlist 為 None 時依訓練樣本數取 4 * sqrt(n)；nprobe / ef_search 會寫入索引檔，載入後直接生效
+DEFAULT_INDEX_PARAMS = {
+    "nlist": None,
+    "nprobe": 16,
+    "pq_m": 48,
+    "pq_nbits": 8,
+    "hnsw_m": 32,
+    "ef_construction": 200,
+    "ef_search": 64
+}
+
+# IVF 每個分群建議的最少訓練樣本數，以及建置時最多緩衝多少向量作為訓練樣本
+MIN_POINTS_PER_CENTROID = 39
+MAX_TRAIN_SIZE = 100000
+
+# 段落中數值欄位的單位，標籤沿用 industry_registry 中的 Excel 欄位名稱
+PASSAGE_UNITS = {
+    "avg_5_year_dividend_yield": "%",
+    "net_value_per_share": "元",
+    "earnings_per_share": "元",
+    "net_asset_value_per_etf": "元"
+}
+
+def render_passage(industry: Industry, row: Dict) -> str:
+    # 每支股票一個段落，格式與原本 faiss_db 的股票資料相同，另加上產業與合理價格區間
+    labels = {column: label for label, column in industry.column_map.items()}
+    lines = [
+        f"股票編號：{row['stock_code'].replace('XTAI:', '')}",
+        f"股票名稱：{row['stock_name']}",
+        f"產業：{industry.name}"
+    ]
+    for column in industry.value_columns:
+        if column == "stock_name":
+            continue
+        value = row.get(column)
+        text = "無資料" if value is None else f"{value}{PASSAGE_UNITS.get(column, '')}"
+        lines.append(f"{labels[column]}：{text}")
+    lines.append(f"合理價格區間：{row.get('fair_price_range') or '不予評等'}")
+    return "\n".join(lines)
+
+def stream_stocks(conn, batch_size: int = STREAM_BATCH_SIZE) -> Iterator[Tuple[Industry, Dict]]:
+    # 以伺服器端游標逐批讀取各產業的基本面資料，不一次載入整張表
+    for industry in INDUSTRIES:
+        columns = ["stock_code"] + industry.value_columns + ["fair_price_range"]
+        cursor = conn.cursor(name=f"rag_index_{industry.slug}")
+        cursor.itersize = batch_size
+        try:
+            cursor.execute(f"""
+                SELECT {", ".join(columns)}
+                FROM {industry.value_table}
+                ORDER BY stock_code;
+            """)
+            for record in cursor:
+                yield industry, dict(zip(columns, record))
+        finally:
+            cursor.close()
+
+def fingerprint(passage: str) -> str:
+    return hashlib.sha1(passage.encode("utf-8")).hexdigest()
+
+def needs_training(index_type: str) -> bool:
+    return index_type in ("ivf_flat", "ivf_pq")
+
+def supports_remove(index_type: str) -> bool:
+    return index_type != "hnsw"
+
+def create_index(index_type: str, dim: int, n_train: int = 0, params: Optional[Dict] = None):
+    # 建立 L2 距離的向量索引 (不含 ID 對應)，n_train 為訓練樣本數，樣本不足時自動縮小分群數與 PQ 位元數
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"不支援的索引類型: {index_type}")
+    params = {**DEFAULT_INDEX_PARAMS, **(params or {})}
+
+    if index_type == "flat":
+        return faiss.IndexFlatL2(dim)
+
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, params["hnsw_m"])
+        index.hnsw.efConstruction = params["ef_construction"]
+        index.hnsw.efSearch = params["ef_search"]
+        return index
+
+    nlist = params["nlist"] or int(4 * math.sqrt(max(n_train, 1)))
+    if n_train:
+        nlist = max(1, min(nlist, n_train // MIN_POINTS_PER_CENTROID))
+    quantizer = faiss.IndexFlatL2(dim)
+    if index_type == "ivf_flat":
+        index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+    else:
+        if dim % params["pq_m"]:
+            raise ValueError(f"向量維度 {dim} 無法被 PQ 子向量數 {params['pq_m']} 整除")
+        nbits = params["pq_nbits"]
+        if n_train:
+            nbits = max(1, min(nbits, int(math.log2(n_train))))
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, params["pq_m"], nbits)
+    index.nprobe = min(params["nprobe"], nlist)
+    return index
+
+class StockIndexBuilder:
+    # 由資料庫建立 LangChain 相容的 faiss_db (index.faiss + index.pkl)。
+    # 向量以 IndexIDMap2 依股票編號的固定 ID 存放，build_state.json 記錄每支股票的 ID 與段落指紋，
+    # 重建時只重新編碼段落內容有變動的股票，並移除已不存在的股票
+    def __init__(self, db_dir: str = FAISS_DB_DIR, embedding: Optional[Embeddings] = None,
+                 db_params: Optional[Dict] = None, model_name: str = E5_MODEL_NAME,
+                 index_type: str = INDEX_TYPE, index_params: Optional[Dict] = None):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"不支援的索引類型: {index_type}")
+        self.db_dir = db_dir
+        self.model_name = model_name
+        self.index_type = index_type
+        self.index_params = {**DEFAULT_INDEX_PARAMS, **(index_params or {})}
+        self.embedding = embedding or CachedE5Embedding(model_name=model_name)
+        self.db_params = db_params or DB_PARAMS
+
+        self.index = None
+        self.docstore = InMemoryDocstore({})
+        self.index_to_docstore_id = {}
+        # 股票編號 -> {"id": FAISS ID, "fingerprint": 段落指紋}
+        self.stocks = {}
+        self.next_id = 0
+        # IVF 索引訓練前先緩衝的 (向量, ID)
+        self.pending = []
+
+    def reset(self) -> None:
+        self.index = None
+        self.docstore = InMemoryDocstore({})
+        self.index_to_docstore_id = {}
+        self.stocks = {}
+        self.next_id = 0
+        self.pending = []
+
+    def load(self) -> None:
+        state_path = os.path.join(self.db_dir, BUILD_STATE_FILE)
+        if not os.path.exists(state_path):
+            # 沒有建置紀錄 (例如下載的靜態 faiss_db) 時整個重建
+            logging.info(f"{self.db_dir} 沒有建置紀錄，將完整重建索引")
+            return
+
+        with open(state_path, encoding="utf-8") as f:
+            state = json.load(f)
+        if state.get("model") != self.model_name:
+            logging.info(f"嵌入模型由 {state.get('model')} 變更為 {self.model_name}，將完整重建索引")
+            return
+        index_config = {"type": self.index_type, "params": self.index_params}
+        if state.get("index", {"type": "flat", "params": DEFAULT_INDEX_PARAMS}) != index_config:
+            logging.info(f"索引設定變更為 {index_config}，將完整重建索引")
+            return
+
+        self.index = faiss.read_index(os.path.join(self.db_dir, "index.faiss"))
+        with open(os.path.join(self.db_dir, "index.pkl"), "rb") as f:
+            self.docstore, self.index_to_docstore_id = pickle.load(f)
+        self.stocks = state["stocks"]
+        self.next_id = state["next_id"]
+        logging.info(f"載入既有索引，共 {len(self.stocks)} 支股票")
+
+    def remove_stocks(self, stock_codes: List[str]) -> None:
+        if not stock_codes:
+            return
+        ids = [self.stocks[stock_code]["id"] for stock_code in stock_codes]
+        self.index.remove_ids(np.asarray(ids, dtype=np.int64))
+        self.docstore.delete(stock_codes)
+        for stock_code, faiss_id in zip(stock_codes, ids):
+            del self.index_to_docstore_id[faiss_id]
+            del self.stocks[stock_code]
+
+    def apply_batch(self, batch: List[Tuple[str, Industry, str, str]], stats: Dict) -> None:
+        vectors = np.asarray(self.embedding.embed_documents([passage for _, _, passage, _ in batch]),
+                             dtype=np.float32)
+
+        # 內容變動的股票沿用原本的 ID，先移除舊向量與文件
+        ids = []
+        for stock_code, _, _, _ in batch:
+            entry = self.stocks.get(stock_code)
+            if entry:
+                ids.append(entry["id"])
+                stats["updated"] += 1
+            else:
+                ids.append(self.next_id)
+                self.next_id += 1
+                stats["added"] += 1
+        self.remove_stocks([stock_code for stock_code, _, _, _ in batch if stock_code in self.stocks])
+
+        for faiss_id, (stock_code, industry, passage, passage_fingerprint) in zip(ids, batch):
+            self.docstore.add({stock_code: Document(
+                page_content=passage,
+                metadata={"source": industry.value_table, "stock_code": stock_code, "industry_type": industry.name}
+            )})
+            self.index_to_docstore_id[faiss_id] = stock_code
+            self.stocks[stock_code] = {"id": faiss_id, "fingerprint": passage_fingerprint}
+        self.add_vectors(vectors, np.asarray(ids, dtype=np.int64))
+
+    def add_vectors(self, vectors: np.ndarray, ids: np.ndarray) -> None:
+        if self.index is not None:
+            self.index.add_with_ids(vectors, ids)
+            return
+
+        # 需訓練的索引先緩衝向量，累積到足夠的訓練樣本 (或資料讀完) 才建立索引
+        self.pending.append((vectors, ids))
+        if needs_training(self.index_type) and sum(len(v) for v, _ in self.pending) < MAX_TRAIN_SIZE:
+            return
+        self.flush_pending()
+
+    def flush_pending(self) -> None:
+        if not self.pending:
+            return
+        vectors = np.concatenate([v for v, _ in self.pending])
+        ids = np.concatenate([i for _, i in self.pending])
+        self.pending = []
+
+        index = create_index(self.index_type, vectors.shape[1], len(vectors), self.index_params)
+        if not index.is_trained:
+            logging.info(f"以 {len(vectors)} 筆向量訓練 {self.index_type} 索引")
+            index.train(vectors)
+        self.index = faiss.IndexIDMap2(index)
+        self.index.add_with_ids(vectors, ids)
+
+    def save(self) -> None:
+        # 先寫入暫存資料夾再整個置換，載入端不會讀到寫到一半的索引
+        tmp_dir = f"{self.db_dir}.tmp"
+        old_dir = f"{self.db_dir}.old"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        faiss.write_index(self.index, os.path.join(tmp_dir, "index.faiss"))
+        with open(os.path.join(tmp_dir, "index.pkl"), "wb") as f:
+            pickle.dump((self.docstore, self.index_to_docstore_id), f)
+        with open(os.path.join(tmp_dir, BUILD_STATE_FILE), "w", encoding="utf-8") as f:
+            json.dump({
+                "model": self.model_name,
+                "index": {"type": self.index_type, "params": self.index_params},
+                "next_id": self.next_id,
+                "stocks": self.stocks
+            }, f, ensure_ascii=False)
+
+        shutil.rmtree(old_dir, ignore_errors=True)
+        if os.path.exists(self.db_dir):
+            os.replace(self.db_dir, old_dir)
+        os.replace(tmp_dir, self.db_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    def scan(self, conn) -> Iterator[Tuple[str, Industry, str, str]]:
+        # 依序產生 (股票編號, 產業, 段落, 指紋)，重複出現的股票只取第一筆
+        seen = set()
+        for industry, row in stream_stocks(conn):
+            stock_code = row["stock_code"]
+            if stock_code in seen:
+                logging.warning(f"股票 {stock_code} 重複出現在 {industry.value_table}，略過")
+                continue
+            seen.add(stock_code)
+
+            passage = render_passage(industry, row)
+            yield stock_code, industry, passage, fingerprint(passage)
+
+    def has_changes(self, conn) -> bool:
+        seen = set()
+        for stock_code, _, _, passage_fingerprint in self.scan(conn):
+            seen.add(stock_code)
+            entry = self.stocks.get(stock_code)
+            if not entry or entry["fingerprint"] != passage_fingerprint:
+                return True
+        return any(stock_code not in seen for stock_code in self.stocks)
+
+    def build(self) -> Dict:
+        self.load()
+        stats = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+        seen = set()
+        batch = []
+
+        conn = psycopg2.connect(**self.db_params)
+        try:
+            if self.index is not None and not supports_remove(self.index_type) and self.has_changes(conn):
+                # HNSW 無法移除向量，有任何變動就整個重建；未變動的段落會由嵌入快取直接取得
+                logging.info(f"{self.index_type} 索引不支援移除向量，資料有變動，將完整重建索引")
+                self.reset()
+
+            for stock_code, industry, passage, passage_fingerprint in self.scan(conn):
+                seen.add(stock_code)
+                entry = self.stocks.get(stock_code)
+                if entry and entry["fingerprint"] == passage_fingerprint:
+                    stats["unchanged"] += 1
+                    continue
+
+                batch.append((stock_code, industry, passage, passage_fingerprint))
+                if len(batch) >= EMBED_BATCH_SIZE:
+                    self.apply_batch(batch, stats)
+                    batch = []
+
+            if batch:
+                self.apply_batch(batch, stats)
+            self.flush_pending()
+        finally:
+            conn.close()
+
+        removed = [stock_code for stock_code in self.stocks if stock_code not in seen]
+        self.remove_stocks(removed)
+        stats["removed"] = len(removed)
+
+        if self.index is None:
+            logging.warning("資料庫中沒有任何股票資料，未建立索引")
+        elif stats["added"] or stats["updated"] or stats["removed"] or not os.path.exists(
+                os.path.join(self.db_dir, BUILD_STATE_FILE)):
+            self.save()
+        logging.info(f"索引更新完成: {stats}")
+        return stats
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    stats = StockIndexBuilder().build()
+    print(f"faiss_db 更新完成：新增 {stats['added']} 筆、更新 {stats['updated']} 筆、"
+          f"移除 {stats['removed']} 筆、未變動 {stats['unchanged']} 筆")
+
+if __name__ == "__main__":
+    main()
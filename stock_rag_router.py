@@ -0,0 +1,201 @@
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import psycopg2
+
+from industry_registry import COMMON_COLUMNS, MODEL_COLUMNS
+from stock_rag_index import render_passage, stream_stocks
+
+# 段落標籤 -> 欄位，涵蓋 faiss_db 段落 (含下載的舊版 faiss_db) 與資料庫額外載入的欄位
+PASSAGE_LABELS = {
+    "股票編號": "stock_code",
+    "股票名稱": "stock_name",
+    "產業": "industry_type",
+    **{label: column for label, column in COMMON_COLUMNS.items() if column not in ("stock_code", "stock_name")},
+    **{label: column for columns in MODEL_COLUMNS.values() for label, column in columns.items()},
+    "合理價格區間": "fair_price_range",
+    "最新收盤價": "close_price",
+    "買賣評等": "rating"
+}
+COLUMN_LABELS = {column: label for label, column in PASSAGE_LABELS.items()}
+
+# 問題中的指標說法 -> 欄位；「淨值」依股票類型可能是每股淨值或 ETF 淨值，依序取第一個有資料的欄位
+METRIC_SYNONYMS = {
+    "每股盈餘": ["earnings_per_share"],
+    "EPS": ["earnings_per_share"],
+    "本益比": ["price_to_earnings_ratio"],
+    "P/E": ["price_to_earnings_ratio"],
+    "PE": ["price_to_earnings_ratio"],
+    "殖利率": ["avg_5_year_dividend_yield"],
+    "每股淨值": ["net_value_per_share"],
+    "ETF淨值": ["net_asset_value_per_etf"],
+    "淨值": ["net_value_per_share", "net_asset_value_per_etf"],
+    "股淨比": ["book_to_net_value_ratio"],
+    "本淨比": ["book_to_net_value_ratio"],
+    "P/B": ["book_to_net_value_ratio"],
+    "PB": ["book_to_net_value_ratio"],
+    "合理價格區間": ["fair_price_range"],
+    "合理價格": ["fair_price_range"],
+    "合理價": ["fair_price_range"],
+    "股價": ["close_price"],
+    "收盤價": ["close_price"],
+    "買賣評等": ["rating"],
+    "評等": ["rating"]
+}
+
+# 詢問整筆資料的說法
+BASIC_INFO_KEYWORDS = ("基本資料", "基本面", "資料", "資訊")
+
+# 去除股票與指標後仍含這些字詞時視為開放式問題，交給檢索與 LLM 回答
+OPEN_ENDED_KEYWORDS = ("推薦", "建議", "適合", "值得", "為什麼", "為何", "比較", "分析", "預測", "走勢",
+                       "怎麼", "如何", "是否", "嗎", "哪", "買", "賣", "高", "低")
+
+TRIE_END = ""
+
+def is_ascii_alnum(ch: str) -> bool:
+    return ch.isascii() and ch.isalnum()
+
+class Trie:
+    # 字元前綴樹，由左至右找出不重疊的最長匹配；英數字詞需前後不接英數字，避免 2330 匹配到 12330
+    def __init__(self):
+        self.root = {}
+
+    def add(self, word: str, value) -> None:
+        node = self.root
+        for ch in word.upper():
+            node = node.setdefault(ch, {})
+        node[TRIE_END] = value
+
+    def is_boundary(self, text: str, start: int, end: int) -> bool:
+        if is_ascii_alnum(text[start]) and start > 0 and is_ascii_alnum(text[start - 1]):
+            return False
+        if is_ascii_alnum(text[end - 1]) and end < len(text) and is_ascii_alnum(text[end]):
+            return False
+        return True
+
+    def find_all(self, text: str) -> List[Tuple[int, int, object]]:
+        text = text.upper()
+        matches = []
+        i = 0
+        while i < len(text):
+            node = self.root
+            match = None
+            j = i
+            while j < len(text) and text[j] in node:
+                node = node[text[j]]
+                j += 1
+                if TRIE_END in node and self.is_boundary(text, i, j):
+                    match = (i, j, node[TRIE_END])
+            if match:
+                matches.append(match)
+                i = match[1]
+            else:
+                i += 1
+        return matches
+
+def parse_passages(text: str) -> List[Dict[str, str]]:
+    # 段落以空行分隔，每行為「標籤：值」，一個段落可能含多支股票
+    records = []
+    for block in text.split("\n\n"):
+        record = {}
+        for line in block.strip().splitlines():
+            label, sep, value = line.partition("：")
+            if sep and label.strip() in PASSAGE_LABELS:
+                record[PASSAGE_LABELS[label.strip()]] = value.strip()
+        if record.get("stock_code") and record.get("stock_name"):
+            records.append(record)
+    return records
+
+class StockQueryRouter:
+    # 聊天機器人前的意圖判斷：問題只是查詢特定股票的指標或基本資料時，直接由記憶體中的資料表回答，
+    # 其他開放式問題回傳 None，交給檢索與 LLM
+    def __init__(self, records: Iterable[Dict[str, str]]):
+        self.records = {}
+        self.stock_trie = Trie()
+        self.metric_trie = Trie()
+        for synonym, columns in METRIC_SYNONYMS.items():
+            self.metric_trie.add(synonym, columns)
+        for record in records:
+            self.add_record(record)
+        logging.info(f"股票查詢路由載入 {len(self.records)} 支股票")
+
+    def add_record(self, record: Dict[str, str]) -> None:
+        stock_code = record["stock_code"].replace("XTAI:", "")
+        merged = {**self.records.get(stock_code, {}), **record, "stock_code": stock_code}
+        self.records[stock_code] = merged
+        self.stock_trie.add(stock_code, stock_code)
+        self.stock_trie.add(merged["stock_name"], stock_code)
+
+    @classmethod
+    def from_docstore(cls, docstore) -> "StockQueryRouter":
+        # 由 faiss_db 的文件庫建立，不需連線資料庫
+        records = []
+        for document in docstore._dict.values():
+            records.extend(parse_passages(document.page_content))
+        return cls(records)
+
+    @classmethod
+    def from_db(cls, conn) -> "StockQueryRouter":
+        # 由各產業基本面資料表建立，並加上合併表中每支股票最新的收盤價與評等
+        records = []
+        for industry, row in stream_stocks(conn):
+            records.extend(parse_passages(render_passage(industry, row)))
+
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT DISTINCT ON (stock_code) stock_code, stock_name, close_price, rating
+                FROM stock_all_industry_merge
+                ORDER BY stock_code, date DESC;
+            """)
+        except psycopg2.errors.UndefinedTable:
+            conn.rollback()
+            logging.warning("合併表不存在，查詢路由不提供股價與評等")
+            return cls(records)
+
+        for stock_code, stock_name, close_price, rating in cursor.fetchall():
+            extra = {"stock_code": stock_code, "stock_name": stock_name, "rating": rating or "不予評等"}
+            if close_price is not None:
+                extra["close_price"] = f"{close_price}元"
+            records.append(extra)
+        return cls(records)
+
+    def entities(self, question: str) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+        # 問題中提到的股票代碼與指標欄位，供回答快取區分只差在股票或指標的相似問題
+        stock_codes = tuple(dict.fromkeys(stock_code for _, _, stock_code in self.stock_trie.find_all(question)))
+        columns = tuple(dict.fromkeys(column for _, _, columns in self.metric_trie.find_all(question)
+                                      for column in columns))
+        return stock_codes, columns
+
+    def format_metric(self, record: Dict[str, str], columns: List[str]) -> str:
+        title = f"{record['stock_name']} ({record['stock_code']})"
+        for column in columns:
+            if record.get(column):
+                return f"{title} 的{COLUMN_LABELS[column]}：{record[column]}"
+        return f"{title} 沒有{COLUMN_LABELS[columns[0]]}的資料"
+
+    def format_record(self, record: Dict[str, str]) -> str:
+        return "\n".join(f"{COLUMN_LABELS[column]}：{value}" for column, value in record.items())
+
+    def answer(self, question: str) -> Optional[str]:
+        stocks = self.stock_trie.find_all(question)
+        if not stocks:
+            return None
+        metrics = self.metric_trie.find_all(question)
+
+        # 去除股票與指標字詞後，剩下的文字含開放式用語就交給 LLM
+        remainder = question
+        for start, end, _ in sorted(stocks + metrics, key=lambda match: match[0], reverse=True):
+            remainder = remainder[:start] + " " + remainder[end:]
+        if any(keyword in remainder for keyword in OPEN_ENDED_KEYWORDS):
+            return None
+
+        stock_codes = list(dict.fromkeys(stock_code for _, _, stock_code in stocks))
+        records = [self.records[stock_code] for stock_code in stock_codes]
+        if metrics:
+            metric_columns = list(dict.fromkeys(tuple(columns) for _, _, columns in metrics))
+            return "\n".join(self.format_metric(record, list(columns))
+                             for record in records for columns in metric_columns)
+        if any(keyword in remainder for keyword in BASIC_INFO_KEYWORDS):
+            return "\n\n".join(self.format_record(record) for record in records)
+        return None
@@ -1,22 +1,176 @@
-from flask import Flask, jsonify, render_template_string
+from flask import Flask, Response, jsonify, render_template_string, request
 import psycopg2
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 import logging
-from datetime import datetime
+import json
+import base64
+import select
+import threading
+import time
+import gzip
+import hashlib
+from collections import OrderedDict
+from datetime import date, datetime
+from stock_data_version import DATA_VERSION_CHANNEL, get_data_version
+from db_pool import DB_PARAMS, getconn, putconn
+from industry_registry import INDUSTRIES, PARTITIONED_PRICE_TABLE, PRICE_STORAGE, get_industry
+# 排序鍵與合併表的排序索引共用同一組運算式
+from stock_data_merge import SORT_COLUMNS
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 # 創建 Flask 應用
 app = Flask(__name__)
 
+MAX_PAGE_SIZE = 1000
+
+# 游標中排序鍵值的型別，未指定排序時以 industry_type 排序
+CURSOR_VALUE_TYPES = {
+    "industry_type": (str,),
+    "stock_code": (str,),
+    "close_price": (int, float, type(None)),
+    "avg_5_year_dividend_yield": (int, float),
+    "rating": (int,),
+}
+
+def encode_cursor(sort: str, order: str, values: Tuple) -> str:
+    # 游標記錄產生時的排序欄位與方向，換了排序條件的游標不可沿用
+    return base64.urlsafe_b64encode(json.dumps([sort, order, *values], default=str).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str, sort: str, order: str) -> List:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise ValueError("無效的分頁游標")
+    if not isinstance(values, list) or len(values) != 5:
+        raise ValueError("無效的分頁游標")
+    if values[:2] != [sort, order]:
+        raise ValueError("分頁游標與目前的排序條件不符，請重新查詢第一頁")
+    sort_value, stock_code, date_value = values[2:]
+    if (isinstance(sort_value, bool) or not isinstance(sort_value, CURSOR_VALUE_TYPES[sort])
+            or not isinstance(stock_code, str) or not isinstance(date_value, str)):
+        raise ValueError("無效的分頁游標")
+    return values[2:]
+
+# 查詢結果快取設定
+CACHE_TTL_SECONDS = 300
+CACHE_MAX_ENTRIES = 256
+
+# 回應內容小於此位元組數時不壓縮
+MIN_COMPRESS_SIZE = 1024
+
+class CachedStocks:
+    # 已序列化的查詢結果，連同 ETag、資料版本時間與各壓縮格式的內容
+    def __init__(self, body: bytes, next_cursor: Optional[str], version: int,
+                 last_modified: Optional[datetime]):
+        self.body = body
+        self.next_cursor = next_cursor
+        self.last_modified = last_modified
+        self.etag = f"v{version}-{hashlib.sha1(body).hexdigest()[:16]}"
+        self._encoded = {}
+        self._lock = threading.Lock()
+
+    def encoded_body(self, encoding: str) -> bytes:
+        with self._lock:
+            if encoding not in self._encoded:
+                if encoding == 'br':
+                    self._encoded[encoding] = brotli.compress(self.body)
+                else:
+                    self._encoded[encoding] = gzip.compress(self.body)
+            return self._encoded[encoding]
+
+def choose_encoding(body: bytes) -> Optional[str]:
+    if len(body) < MIN_COMPRESS_SIZE:
+        return None
+    available = ['br', 'gzip'] if brotli else ['gzip']
+    return request.accept_encodings.best_match(available)
+
+class StockResultCache:
+    # 以查詢參數為鍵，保存已序列化的 JSON 內容；
+    # 超過 TTL 或合併作業通知資料變更時失效，超過容量時淘汰最久未使用的項目
+    def __init__(self, ttl_seconds: float = CACHE_TTL_SECONDS, max_entries: int = CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, generation: int) -> None:
+        with self._lock:
+            # 查詢期間若已失效過，結果可能是舊資料，不寫入快取
+            if generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+
+stock_cache = StockResultCache()
+_listener_lock = threading.Lock()
+_listener_thread = None
+
+def listen_for_data_changes(db_params: Dict, cache: StockResultCache) -> None:
+    # 以 LISTEN 等待合併作業完成的通知，收到後清空快取；連線中斷時重新連線
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(**db_params)
+            conn.autocommit = True
+            conn.cursor().execute(f"LISTEN {DATA_VERSION_CHANNEL};")
+            # 重新連線期間可能錯過通知，保守起見先清空
+            cache.invalidate()
+            logging.info("開始監聽資料變更通知")
+            
+            while True:
+                if select.select([conn], [], [], 60) == ([], [], []):
+                    continue
+                conn.poll()
+                if conn.notifies:
+                    payloads = [notify.payload for notify in conn.notifies]
+                    conn.notifies.clear()
+                    cache.invalidate()
+                    logging.info(f"收到資料變更通知 {payloads}，已清空查詢快取")
+                    
+        except Exception as e:
+            logging.error(f"監聽資料變更通知時發生錯誤: {str(e)}")
+            time.sleep(5)
+        finally:
+            if conn:
+                conn.close()
+
+def ensure_cache_listener(db_params: Dict) -> None:
+    global _listener_thread
+    with _listener_lock:
+        if _listener_thread is None or not _listener_thread.is_alive():
+            _listener_thread = threading.Thread(
+                target=listen_for_data_changes, args=(db_params, stock_cache), daemon=True
+            )
+            _listener_thread.start()
+
 class StockEvaluationSystem:
     def __init__(self):
-        # 設定資料庫連線參數
-        self.db_params = {
-            'dbname': 'stock_recommendation_system',
-            'user': 'test',
-            'password': '123456',
-            'host': 'localhost',
-            'port': '5433'
-        }
+        # 設定資料庫連線參數，查詢連線由共用連線池提供
+        self.db_params = DB_PARAMS
         
         # 設定日誌
         logging.basicConfig(
@@ -25,12 +179,54 @@ class StockEvaluationSystem:
         )
 
     def get_stock_evaluations(self) -> List[Dict]:
+        results, _ = self.query_stock_evaluations()
+        return results
+
+    def query_stock_evaluations(self, industry: Optional[str] = None, rating: Optional[str] = None,
+                                min_yield: Optional[float] = None, sort: Optional[str] = None,
+                                order: str = "asc", limit: Optional[int] = None,
+                                cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        # 篩選、排序與分頁皆在 SQL 中完成；分頁採 keyset，
+        # 以 (排序鍵, stock_code, date) 作為游標，回傳下一頁游標 (無下一頁時為 None)
+        if sort is not None and sort not in SORT_COLUMNS:
+            raise ValueError(f"不支援的排序欄位: {sort}")
+        if order not in ("asc", "desc"):
+            raise ValueError(f"不支援的排序方向: {order}")
+        if limit is not None and not 1 <= limit <= MAX_PAGE_SIZE:
+            raise ValueError(f"每頁筆數須介於 1 到 {MAX_PAGE_SIZE}")
+        
+        sort_key = SORT_COLUMNS[sort] if sort else "industry_type"
+        direction = "DESC" if order == "desc" else "ASC"
+        
+        conditions = []
+        params = []
+        if industry:
+            conditions.append("industry_type = %s")
+            params.append(industry)
+        if rating:
+            conditions.append("rating = %s")
+            params.append(rating)
+        if min_yield is not None:
+            conditions.append("avg_5_year_dividend_yield >= %s")
+            params.append(min_yield)
+        if cursor:
+            comparison = "<" if direction == "DESC" else ">"
+            conditions.append(f"({sort_key}, stock_code, date) {comparison} (%s, %s, %s)")
+            params.extend(decode_cursor(cursor, sort or "industry_type", order))
+        
+        where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        limit_clause = ""
+        if limit is not None:
+            # 多取一筆以判斷是否還有下一頁
+            limit_clause = "LIMIT %s"
+            params.append(limit + 1)
+        
         conn = None
         try:
-            conn = psycopg2.connect(**self.db_params)
-            cursor = conn.cursor()
+            conn = getconn()
+            db_cursor = conn.cursor()
             
-            query = """
+            query = f"""
                 SELECT 
                     stock_code,
                     stock_name,
@@ -38,19 +234,32 @@ class StockEvaluationSystem:
                     date,
                     close_price,
                     fair_value_range,
-                    avg_5_year_dividend_yield
+                    fair_low,
+                    fair_high,
+                    rating,
+                    avg_5_year_dividend_yield,
+                    {sort_key} AS sort_key
                 FROM stock_all_industry_merge 
-                ORDER BY industry_type, stock_code;
+                {where_clause}
+                ORDER BY {sort_key} {direction}, stock_code {direction}, date {direction}
+                {limit_clause};
             """
             
-            cursor.execute(query)
-            stocks = cursor.fetchall()
+            db_cursor.execute(query, params)
+            stocks = db_cursor.fetchall()
+            
+            next_cursor = None
+            if limit is not None and len(stocks) > limit:
+                stocks = stocks[:limit]
+                last = stocks[-1]
+                next_cursor = encode_cursor(sort or "industry_type", order, (last[10], last[0], last[3].isoformat()))
             
             results = []
             for stock in stocks:
-                stock_code, stock_name, industry, date, price, fair_range, dividend_yield = stock
+                stock_code, stock_name, industry, date, price, fair_range, fair_low, fair_high, rating, dividend_yield, _ = stock
                 
-                evaluation = self.evaluate_stock(price, fair_range)
+                # 評等已在合併時預先計算，僅在缺值時才即時計算
+                evaluation = rating or self.evaluate_stock(price, fair_low, fair_high)
                 
                 results.append({
                     "stock_code": stock_code.replace('XTAI:', ''),
@@ -58,40 +267,93 @@ class StockEvaluationSystem:
                     "industry_type": industry,
                     "close_price": round(price, 2),
                     "fair_value_range": fair_range,
+                    "fair_low": fair_low,
+                    "fair_high": fair_high,
                     "rating": evaluation,
                     "avg_5_year_dividend_yield": round(dividend_yield, 2) if dividend_yield else 0,
                     "date": date.strftime("%Y-%m-%d")
                 })
             
-            return results
+            return results, next_cursor
             
         except Exception as e:
             logging.error(f"獲取股票資料時發生錯誤: {str(e)}")
             raise
         finally:
             if conn:
-                conn.close()
-
-    def evaluate_stock(self, current_price: float, fair_value_range: str) -> str:
+                putconn(conn)
+
+    def query_price_history(self, stock_code: str, start: Optional[date] = None,
+                            end: Optional[date] = None, industry: Optional[str] = None) -> List[Dict]:
+        # 使用分割表時，指定產業與日期區間只會掃描對應的分割區；
+        # 未使用分割表時合併查詢各產業的股價表
+        if not stock_code.startswith('XTAI:'):
+            stock_code = f"XTAI:{stock_code}"
+        if industry:
+            get_industry(industry)
+        
+        if PRICE_STORAGE == 'partitioned':
+            source = PARTITIONED_PRICE_TABLE
+        else:
+            source = "(" + " UNION ALL ".join(
+                f"SELECT '{item.name}' AS industry_type, stock_code, date, close_price FROM {item.price_table}"
+                for item in INDUSTRIES
+            ) + ") prices"
+        
+        conditions = ["stock_code = %s"]
+        params = [stock_code]
+        if industry:
+            conditions.append("industry_type = %s")
+            params.append(industry)
+        if start:
+            conditions.append("date >= %s")
+            params.append(start)
+        if end:
+            conditions.append("date <= %s")
+            params.append(end)
+        
+        conn = None
         try:
-            low_str, high_str = fair_value_range.split("~")
-            low_price = float(low_str.strip())
-            high_price = float(high_str.strip())
+            conn = getconn()
+            db_cursor = conn.cursor()
+            db_cursor.execute(f"""
+                SELECT industry_type, date, close_price
+                FROM {source}
+                WHERE {' AND '.join(conditions)}
+                ORDER BY date;
+            """, params)
             
-            avg_price = (low_price + high_price) / 2
+            return [
+                {
+                    "industry_type": industry_type,
+                    "date": price_date.strftime("%Y-%m-%d"),
+                    "close_price": round(close_price, 2)
+                }
+                for industry_type, price_date, close_price in db_cursor.fetchall()
+            ]
             
-            if current_price < low_price:
-                return "加碼"
-            elif current_price < avg_price:
-                return "便宜"
-            elif current_price <= high_price:
-                return "合理"
-            else:
-                return "昂貴"
-     
         except Exception as e:
-            logging.error(f"評價計算錯誤: {str(e)}")
+            logging.error(f"獲取股價歷史時發生錯誤: {str(e)}")
+            raise
+        finally:
+            if conn:
+                putconn(conn)
+
+    def evaluate_stock(self, current_price: float, fair_low: float, fair_high: float) -> str:
+        # 合理價格上下限為數值欄位，不予評等的股票上下限為 NULL
+        if current_price is None or fair_low is None or fair_high is None:
             return "不予評價"
+        
+        avg_price = (fair_low + fair_high) / 2
+        
+        if current_price < fair_low:
+            return "加碼"
+        elif current_price < avg_price:
+            return "便宜"
+        elif current_price <= fair_high:
+            return "合理"
+        else:
+            return "昂貴"
 
 # HTML
 HTML_TEMPLATE = """
@@ -247,6 +509,16 @@ HTML_TEMPLATE = """
         .sortable.desc::after {
             content: '↓';
             color: #2b6cb0;
+        }
+
+        .load-more {
+            display: none;
+            margin: 20px auto;
+            padding: 8px 24px;
+            border: 1px solid #ddd;
+            border-radius: 4px;
+            background-color: white;
+            cursor: pointer;
         }      
     </style>
 </head>
@@ -259,12 +531,9 @@ HTML_TEMPLATE = """
                     <label for="industry">產業別</label>
                     <select id="industry" onchange="filterStocks()">
                         <option value="">全部</option>
-                        <option value="金融">金融</option>
-                        <option value="營建">營建</option>
-                        <option value="航運">航運</option>
-                        <option value="半導體">半導體</option>
-                        <option value="電子零組件">電子零組件</option>
-                        <option value="ETF">ETF</option>
+                        {% for industry in industries %}
+                        <option value="{{ industry.name }}">{{ industry.name }}</option>
+                        {% endfor %}
                     </select>
                 </div>
                 <div class="filter-group">
@@ -292,8 +561,8 @@ HTML_TEMPLATE = """
                         <th>名稱</th>
                         <th>產業別</th>
                         <th>日期</th>
-                        <th class="sortable right-align" data-sort="close price">股價</th>
-                        <th class="sortable right-align" data-sort="avg_5_years_dividend_yield">5年平均殖利率</th>
+                        <th class="sortable right-align" data-sort="close_price">股價</th>
+                        <th class="sortable right-align" data-sort="avg_5_year_dividend_yield">5年平均殖利率</th>
                         <th>合理價區間</th>
                         <th class="sortable" data-sort="rating">買賣評等</th>
                     </tr>
@@ -305,37 +574,67 @@ HTML_TEMPLATE = """
                 </tbody>
             </table>
         </div>
+        <button id="loadMore" class="load-more" onclick="loadMore()">載入更多</button>
     </div>
 
     <script>
+        const PAGE_SIZE = 100;
         let stocks = [];
+        let nextCursor = null;
+
+        let currentSort = {
+            column: null,
+            direction: 'asc'
+        };
 
-        // 初始化載入數據
-        async function fetchStocks() {
+        // 依目前的篩選與排序條件組成查詢參數，篩選與排序皆由伺服器處理
+        function buildQuery(cursor) {
+            const params = new URLSearchParams();
+            const industry = document.getElementById('industry').value;
+            const rating = document.getElementById('rating').value;
+            const minYield = document.getElementById('minYield').value;
+
+            if (industry) params.set('industry', industry);
+            if (rating) params.set('rating', rating);
+            if (minYield) params.set('min_yield', minYield);
+            if (currentSort.column) {
+                params.set('sort', currentSort.column);
+                params.set('order', currentSort.direction);
+            }
+            params.set('limit', PAGE_SIZE);
+            if (cursor) params.set('cursor', cursor);
+            return params.toString();
+        }
+
+        // 載入數據，append 為 true 時接續載入下一頁
+        async function fetchStocks(append = false) {
             try {
-                const response = await fetch('/api/stocks');
-                stocks = await response.json();
-                filterStocks();
+                const response = await fetch('/api/stocks?' + buildQuery(append ? nextCursor : null));
+                if (!response.ok) {
+                    throw new Error(`HTTP ${response.status}`);
+                }
+                const page = await response.json();
+                nextCursor = response.headers.get('X-Next-Cursor');
+                stocks = append ? stocks.concat(page) : page;
+                displayStocks(stocks);
+                document.getElementById('loadMore').style.display = nextCursor ? 'block' : 'none';
             } catch (error) {
                 console.error('Error fetching stocks:', error);
-                document.querySelector('.loading').textContent = '載入失敗，請重試';
+                document.getElementById('stockTableBody').innerHTML =
+                    '<tr><td colspan="8" class="loading">載入失敗，請重試</td></tr>';
             }
         }
 
         // 過濾股票
         function filterStocks() {
-            const industry = document.getElementById('industry').value;
-            const rating = document.getElementById('rating').value;
-            const minYield = document.getElementById('minYield').value;
-
-            const filteredStocks = stocks.filter(stock => {
-                const matchIndustry = !industry || stock.industry_type === industry;
-                const matchRating = !rating || stock.rating === rating;
-                const matchYield = !minYield || stock.avg_5_year_dividend_yield >= parseFloat(minYield);
-                return matchIndustry && matchRating && matchYield;
-            });
+            fetchStocks();
+        }
 
-            displayStocks(filteredStocks);
+        // 載入下一頁
+        function loadMore() {
+            if (nextCursor) {
+                fetchStocks(true);
+            }
         }
 
         // 顯示股票數據
@@ -379,23 +678,6 @@ HTML_TEMPLATE = """
             }
         }
 
-        let currentSort = {
-            column: null,
-            direction: 'asc'
-        };
-
-        // 初始化載入數據
-        async function fetchStocks() {
-            try {
-                const response = await fetch('/api/stocks');
-                stocks = await response.json();
-                filterStocks();
-            } catch (error) {
-                console.error('Error fetching stocks:', error);
-                document.querySelector('.loading').textContent = '載入失敗，請重試';
-            }
-        }
-
         // 初始化排序功能
         function initializeSorting() {
             const headers = document.querySelectorAll('th.sortable');
@@ -409,80 +691,29 @@ HTML_TEMPLATE = """
 
         // 排序股票
         function sortStocks(column) {
+            if (currentSort.column === column) {
+                currentSort.direction = currentSort.direction === 'asc' ? 'desc' : 'asc';
+            } else {
+                currentSort.direction = 'asc';
+            }
+            currentSort.column = column;
+
             const headers = document.querySelectorAll('th.sortable');
             headers.forEach(header => {
-                if (header.dataset.sort == column) {
-                    if (currentSort.column === column) {
-                        currentSort.direction = currentSort.direction === 'asc' ? 'desc' : 'asc';
-                    } else {
-                        currentSort.direction = 'asc';
-                    }
-                
+                header.classList.remove('asc', 'desc');
+                if (header.dataset.sort === column) {
                     header.classList.add(currentSort.direction);
-                } else {
-                    header.classList.remove ('asc', 'desc');
-                }
-            });
-
-        currentSort.column = column;
-
-        const sortedStocks = [...stocks].sort((a, b) => {
-            let valueA = a[column];
-            let valueB = b[column];
-
-            // 處理數字類型的排序
-            if (column === 'close_price' || column === 'avg_5_years_dividend_yield') {
-                valueA = parseFloat(valueA);
-                valueB = parseFloat(valueB);
-            }
-
-            if (column === 'rating') {
-                const ratingWeight = {
-                    '加碼': 1,
-                    '便宜': 2,
-                    '合理': 3,
-                    '昂貴': 4
-                };
-                valueA = ratingWeight[valueA] || 999;
-                valueB = ratingWeight[valueB] || 999;
-
                 }
-
-                if (valueA < valueB) return currentSort.direction === 'asc' ? -1 : 1;
-                if (valueA > valueB) return currentSort.direction === 'asc' ? 1 : -1;
-                return 0;
-            });
-            
-            displayStocks(sortedStocks);
-        }
-        
-        function filterStocks() {
-            const industry = document.getElementById('industry').value;
-            const rating = document.getElementById('rating').value;
-            const minYield = document.getElementById('minYield').value;
-
-            const filteredStocks = stocks.filter(stock => {
-                const matchIndustry = !industry || stock.industry_type === industry;
-                const matchRating = !rating || stock.rating === rating;
-                const matchYield = !minYield || stock.avg_5_year_dividend_yield >= parseFloat(minYield);
-                return matchIndustry && matchRating && matchYield;
             });
 
-            if (currentSort.column) {
-                sortStocks(currentSort.column);
-            } else {
-                displayStocks(filteredStocks);
-            }
-        
+            fetchStocks();
         }
 
-        // 確保載入完成後會呼叫初始化
+        // 頁面載入完成後初始化排序並獲取數據
         document.addEventListener('DOMContentLoaded', () => {
+            initializeSorting();
             fetchStocks();
         });
-
-        // 頁面載入時獲取數據
-        fetchStocks();
     </script>
 </body>
 </html>
@@ -490,14 +721,90 @@ HTML_TEMPLATE = """
 
 @app.route('/')
 def index():
-    return render_template_string(HTML_TEMPLATE)
+    return render_template_string(HTML_TEMPLATE, industries=INDUSTRIES)
 
 @app.route('/api/stocks')
 def get_stocks():
+    # 查詢參數：industry、rating、min_yield、sort、order、limit、cursor
+    # 下一頁游標放在 X-Next-Cursor 回應標頭，回應內容維持為股票陣列；
+    # ETag/Last-Modified 對應合併表的資料版本，未變更時回傳 304
     try:
         system = StockEvaluationSystem()
-        stocks = system.get_stock_evaluations()
-        return jsonify(stocks)
+        ensure_cache_listener(system.db_params)
+        
+        cache_key = tuple(sorted(request.args.items(multi=True)))
+        cached = stock_cache.get(cache_key)
+        if cached is None:
+            generation = stock_cache.generation
+            
+            # 先讀取資料版本再查詢，確保 ETag 不會比內容新
+            conn = getconn()
+            try:
+                version, last_modified = get_data_version(conn)
+            finally:
+                putconn(conn)
+            
+            stocks, next_cursor = system.query_stock_evaluations(
+                industry=request.args.get('industry') or None,
+                rating=request.args.get('rating') or None,
+                min_yield=request.args.get('min_yield', type=float),
+                sort=request.args.get('sort') or None,
+                order=request.args.get('order', 'asc'),
+                limit=request.args.get('limit', type=int),
+                cursor=request.args.get('cursor') or None
+            )
+            body = json.dumps(stocks, ensure_ascii=False).encode('utf-8')
+            cached = CachedStocks(body, next_cursor, version, last_modified)
+            stock_cache.set(cache_key, cached, generation)
+        
+        encoding = choose_encoding(cached.body)
+        if encoding:
+            response = Response(cached.encoded_body(encoding), mimetype='application/json')
+            response.headers['Content-Encoding'] = encoding
+        else:
+            response = Response(cached.body, mimetype='application/json')
+        response.vary.add('Accept-Encoding')
+        
+        if cached.next_cursor:
+            response.headers['X-Next-Cursor'] = cached.next_cursor
+        response.set_etag(cached.etag, weak=True)
+        if cached.last_modified:
+            response.last_modified = cached.last_modified
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except psycopg2.DataError as e:
+        # 游標中的日期無法解析
+        logging.warning(f"無效的查詢參數: {str(e)}")
+        return jsonify({"error": "無效的分頁游標"}), 400
+    except Exception as e:
+        logging.error(f"API錯誤: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+def parse_date_arg(name: str) -> Optional[date]:
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise ValueError(f"{name} 日期格式須為 YYYY-MM-DD")
+
+@app.route('/api/stocks/<stock_code>/prices')
+def get_stock_prices(stock_code):
+    # 查詢參數：start、end (YYYY-MM-DD，含端點)、industry (指定時只掃描該產業的分割區)
+    try:
+        system = StockEvaluationSystem()
+        prices = system.query_price_history(
+            stock_code,
+            start=parse_date_arg('start'),
+            end=parse_date_arg('end'),
+            industry=request.args.get('industry') or None
+        )
+        return jsonify(prices)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         logging.error(f"API錯誤: {str(e)}")
         return jsonify({"error": str(e)}), 500
@@ -1,8 +1,8 @@
 from flask import Flask, request, jsonify
 from werkzeug.security import generate_password_hash, check_password_hash
-import psycopg2
 from flask_cors import CORS
 import logging
+from db_pool import getconn, putconn
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -10,14 +10,6 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app)
 
-db_params = {
-    'dbname': 'stock_recommendation_system',
-    'user': 'test',
-    'password': '123456',
-    'host': 'localhost',
-    'port': '5433'
-}
-
 # 註冊端點
 @app.route('/register', methods=['POST'])
 def register():
@@ -35,8 +27,9 @@ def register():
     # 密碼加密
     password_hash = generate_password_hash(password)
     
+    conn = None
     try:
-        conn = psycopg2.connect(**db_params)
+        conn = getconn()
         cur = conn.cursor()
         
         # 檢查用戶名是否已存在
@@ -57,7 +50,7 @@ def register():
         return jsonify({'success': False, 'message': str(e)})
     finally:
         if conn:
-            conn.close()
+            putconn(conn)
 
 # 登入端點
 @app.route('/login', methods=['POST'])
@@ -66,8 +59,9 @@ def login():
     username = data.get('username')
     password = data.get('password')
     
+    conn = None
     try:
-        conn = psycopg2.connect(**db_params)
+        conn = getconn()
         cur = conn.cursor()
         
         # 檢查用戶名和密碼
@@ -98,13 +92,14 @@ def login():
         return jsonify({'success': False, 'message': str(e)})
     finally:
         if conn:
-            conn.close()
+            putconn(conn)
 
 # 獲取用戶資訊端點
 @app.route('/user/info/<username>', methods=['GET'])
 def get_user_info(username):
+    conn = None
     try:
-        conn = psycopg2.connect(**db_params)
+        conn = getconn()
         cur = conn.cursor()
         
         cur.execute("SELECT username, email FROM users WHERE username = %s", (username,))
@@ -124,7 +119,7 @@ def get_user_info(username):
         return jsonify({'success': False, 'message': str(e)})
     finally:
         if conn:
-            conn.close()
+            putconn(conn)
 
 # 更新密碼端點
 @app.route('/user/update-password', methods=['POST', 'OPTIONS'])
@@ -151,7 +146,7 @@ def update_password():
         if len(new_password) < 6:
             return jsonify({'success': False, 'message': '新密碼長度不能小於6個字符'}), 400
 
-        conn = psycopg2.connect(**db_params)
+        conn = getconn()
         cur = conn.cursor()
         
         try:
@@ -199,7 +194,7 @@ def update_password():
         return jsonify({'success': False, 'message': f'系統錯誤: {str(e)}'}), 500
     finally:
         if 'conn' in locals() and conn:
-            conn.close()
+            putconn(conn)
 
 if __name__ == '__main__':
     logger.info("啟動Flask應用程序")
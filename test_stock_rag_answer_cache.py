@@ -0,0 +1,106 @@
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from stock_rag_answer_cache import SemanticAnswerCache
+
+# 固定的問題向量：改寫的問題與原問題幾乎同向，其他問題互相垂直
+QUESTION_VECTORS = {
+    "台積電值得買嗎": [1.0, 0.0, 0.0],
+    "台積電值得買嗎？": [0.99, 0.01, 0.0],
+    "聯發科值得買嗎": [0.0, 1.0, 0.0],
+    "元大台灣50值得買嗎": [0.0, 0.0, 1.0],
+}
+
+class StubEmbedding(Embeddings):
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [QUESTION_VECTORS[text] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return QUESTION_VECTORS[text]
+
+class StubLLM:
+    # 記錄被呼叫的問題，回答內容帶上呼叫次數以區分新舊回答
+    def __init__(self):
+        self.questions = []
+
+    def __call__(self, question: str) -> str:
+        self.questions.append(question)
+        return f"回答 {len(self.questions)}：{question}"
+
+def ask(cache: SemanticAnswerCache, llm: StubLLM, question: str, scope=None) -> str:
+    # 與筆記本的聊天流程相同：先查快取，未命中才呼叫 LLM 並寫回快取
+    answer, vector = cache.lookup(question, scope)
+    if answer is not None:
+        return answer
+    generation = cache.generation
+    answer = llm(question)
+    cache.store(vector, question, answer, scope, generation)
+    return answer
+
+def test_similar_question_hits_cache():
+    cache = SemanticAnswerCache(StubEmbedding(), threshold=0.95)
+    llm = StubLLM()
+
+    first = ask(cache, llm, "台積電值得買嗎", scope=("2330",))
+    second = ask(cache, llm, "台積電值得買嗎？", scope=("2330",))
+
+    assert second == first
+    assert llm.questions == ["台積電值得買嗎"]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_different_scope_misses_cache():
+    cache = SemanticAnswerCache(StubEmbedding(), threshold=0.95)
+    llm = StubLLM()
+
+    ask(cache, llm, "台積電值得買嗎", scope=(("2330",), ("close_price",)))
+    ask(cache, llm, "台積電值得買嗎", scope=(("2330",), ("price_to_earnings_ratio",)))
+
+    assert len(llm.questions) == 2
+    assert cache.hits == 0
+    assert len(cache) == 2
+
+def test_version_change_invalidates_cache():
+    versions = {"current": 1}
+    cache = SemanticAnswerCache(StubEmbedding(), version_source=lambda: versions["current"],
+                                version_check_interval=0)
+    llm = StubLLM()
+
+    first = ask(cache, llm, "台積電值得買嗎")
+    assert ask(cache, llm, "台積電值得買嗎") == first
+
+    versions["current"] = 2
+    second = ask(cache, llm, "台積電值得買嗎")
+
+    assert second != first
+    assert len(llm.questions) == 2
+    assert len(cache) == 1
+
+def test_store_after_invalidation_is_discarded():
+    cache = SemanticAnswerCache(StubEmbedding())
+    answer, vector = cache.lookup("台積電值得買嗎")
+    generation = cache.generation
+
+    # 產生回答期間資料更新，依舊資料產生的回答不應寫入快取
+    cache.invalidate()
+    cache.store(vector, "台積電值得買嗎", "舊資料的回答", generation=generation)
+
+    assert answer is None
+    assert len(cache) == 0
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SemanticAnswerCache(StubEmbedding(), max_entries=2)
+    llm = StubLLM()
+
+    ask(cache, llm, "台積電值得買嗎")
+    ask(cache, llm, "聯發科值得買嗎")
+    # 再次使用台積電的回答，聯發科成為最久未使用的項目
+    ask(cache, llm, "台積電值得買嗎")
+    ask(cache, llm, "元大台灣50值得買嗎")
+
+    assert len(cache) == 2
+    ask(cache, llm, "台積電值得買嗎")
+    assert len(llm.questions) == 3
+    ask(cache, llm, "聯發科值得買嗎")
+    assert llm.questions[-1] == "聯發科值得買嗎"
+    assert len(llm.questions) == 4